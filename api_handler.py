@@ -1,12 +1,24 @@
 # api_handler.py
 
+import asyncio
+import base64
+import json
 import logging
+import math
 import os
-import json
-import requests
+import random
+import time
+from typing import Optional, Tuple
+import httpx
+import numpy as np
+import pandas as pd
 from datetime import datetime
+from dateutil.tz import tzlocal
 import pytz
 from dotenv import load_dotenv
+import store
+from store import DUE_DAY_KEY, get_deadline_text, parse_due_day
+from storage import save_json, load_json
 
 # --- ⚙️ API SOZLAMALARI ⚙️ ---
 load_dotenv()
@@ -17,150 +29,830 @@ if not BILLZ_SECRET_TOKEN:
 
 BASE_URL = "https://api-admin.billz.ai/v1"
 DATA_FILE = "data.json"
+PAGE_LIMIT = 100  # Bitta sahifadagi qarzlar soni
+FETCH_CONCURRENCY = int(os.getenv("BILLZ_FETCH_CONCURRENCY", "5"))  # Bir vaqtda olinadigan sahifalar soni
+SYNC_STATE_FILE = "sync_state.json"  # Oxirgi sinxronlash holati (high-water mark)
+# Sahifa so'rovi xatolarida qayta urinishlar: kutish FETCH_RETRY_DELAY * 2^urinish (+ tasodifiy qo'shimcha)
+FETCH_MAX_RETRIES = int(os.getenv("BILLZ_FETCH_RETRIES", "4"))
+FETCH_RETRY_DELAY = float(os.getenv("BILLZ_FETCH_RETRY_DELAY", "1"))
+FETCH_RETRY_MAX_DELAY = 30
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Tugallanmagan sinxronlashning olingan sahifalari - keyingi urinish shu yerdan davom etadi
+SYNC_CHECKPOINT_FILE = "sync_checkpoint.json"
+SYNC_CHECKPOINT_PAGES_FILE = "sync_checkpoint_pages.jsonl"
+# Sahifalash offset bo'yicha - orada qo'shilgan/o'chirilgan qarzlar sahifalarni siljitadi,
+# shuning uchun faqat yaqinda uzilgan yuklash davom ettiriladi, eskiroq bo'lsa boshidan
+SYNC_CHECKPOINT_MAX_AGE = int(os.getenv("SYNC_CHECKPOINT_MAX_AGE", "900"))
+# Qisman yangilashda "shu vaqtdan keyin o'zgarganlar" filtri uchun so'rov parametri
+UPDATED_SINCE_PARAM = os.getenv("BILLZ_UPDATED_SINCE_PARAM", "updated_at_from")
+# Qisman yangilashlar o'chirilgan/bekor qilingan qarzlarni ko'rmaydi - shuncha vaqtda bir marta to'liq yuklanadi
+FULL_SYNC_INTERVAL = int(os.getenv("BILLZ_FULL_SYNC_INTERVAL", str(24 * 3600)))
 TZ_UZB = pytz.timezone('Asia/Tashkent')
+# Access token: muddati ma'lum bo'lmasa shuncha sekund amal qiladi deb hisoblanadi,
+# muddati tugashidan TOKEN_REFRESH_MARGIN sekund oldin yangisi olinadi
+TOKEN_TTL = int(os.getenv("BILLZ_TOKEN_TTL", "3600"))
+TOKEN_REFRESH_MARGIN = int(os.getenv("BILLZ_TOKEN_REFRESH_MARGIN", "300"))
 
 # Logging sozlash
 logger = logging.getLogger(__name__)
 
-# --- JSON FAYL BILAN ISHLASH FUNKSIYALARI ---
-def save_json(data, filename):
-    """JSON ma'lumotlarni faylga saqlash"""
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+# Oxirgi sinxronlash statistikasi (adminlarga ko'rsatish uchun)
+last_sync_stats = {}
+# Joriy (yoki oxirgi) sinxronlash jarayoni: bosqich, olingan sahifalar, qayta ishlangan yozuvlar
+sync_progress = {}
+
+STATUS_TRANSLATION = {
+    'partial_paid': 'Частично оплачен',
+    'unpaid': 'Не оплачен',
+    'overdue': 'Просрочен'
+}
 
 # --- BILLZ API BILAN ISHLASH FUNKSIYALARI ---
-async def get_access_token():
-    """BILLZ API dan access token olish"""
-    url = f"{BASE_URL}/auth/login"
-    payload = {"secret_token": BILLZ_SECRET_TOKEN}
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """BILLZ uchun umumiy HTTP ulanishlar hovuzi (login va qarzdorliklar bitta sessiyada)"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        limits = httpx.Limits(max_connections=FETCH_CONCURRENCY, max_keepalive_connections=FETCH_CONCURRENCY)
+        _http_client = httpx.AsyncClient(timeout=30, limits=limits)
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def get_token_expiry(data: dict, token: str) -> float:
+    """Token muddati (unix vaqt): javobdagi expires_in, JWT dagi exp yoki TOKEN_TTL"""
+    expires_in = data.get('expires_in')
+    if isinstance(expires_in, (int, float)) and expires_in > 0:
+        return time.time() + expires_in
     try:
-        response = requests.post(url, json=payload, timeout=20)
-        response.raise_for_status()
-        logger.info("Access token muvaffaqiyatli olindi.")
-        return response.json()['data']['access_token']
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Access token olishda xatolik: {e}")
-        return None
+        claims = json.loads(base64.urlsafe_b64decode(token.split('.')[1] + '=' * 3))
+        if isinstance(claims.get('exp'), (int, float)):
+            return float(claims['exp'])
+    except (IndexError, ValueError, AttributeError):
+        pass
+    return time.time() + TOKEN_TTL
 
-async def fetch_all_debts(access_token):
-    """Barcha qarzdorliklarni olish"""
-    headers = {"Authorization": f"Bearer {access_token}"}
-    all_debts_data, page, url = [], 1, f"{BASE_URL}/debt"
-    logger.info("Qarzdorliklarni olish jarayoni boshlandi...")
-    while True:
+class AccessTokenManager:
+    """
+    BILLZ access token keshi: sinxronlashlar orasida qayta ishlatiladi,
+    muddati tugashiga refresh_margin qolganda oldindan yangilanadi.
+    """
+
+    def __init__(self, refresh_margin: int = TOKEN_REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self.token: Optional[str] = None
+        self.expires_at = 0.0
+        self.logins = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def is_fresh(self) -> bool:
+        return self.token is not None and time.time() < self.expires_at - self.refresh_margin
+
+    async def get(self) -> Optional[str]:
+        """Amaldagi token (kerak bo'lsa yangisi olinadi)"""
+        if self.is_fresh():
+            return self.token
+        return await self.refresh(self.token)
+
+    async def refresh(self, rejected: Optional[str]) -> Optional[str]:
+        """
+        rejected token o'rniga yangisini olish. Bir vaqtda bir nechta so'rov 401 olsa,
+        login bir marta bajariladi - qolganlari o'sha yangi tokenni oladi.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.token is not None and self.token != rejected and self.is_fresh():
+                return self.token
+            return await self._login()
+
+    async def _login(self) -> Optional[str]:
         try:
-            response = requests.get(f"{url}?page={page}&limit=100", headers=headers, timeout=30)
+            response = await get_http_client().post(
+                f"{BASE_URL}/auth/login", json={"secret_token": BILLZ_SECRET_TOKEN}, timeout=20
+            )
             response.raise_for_status()
-            data = response.json().get('data', [])
-            if not data:
-                break
-            all_debts_data.extend(data)
-            logger.info(f"Sahifa {page}: {len(data)} ta qarz olindi. Jami: {len(all_debts_data)}")
-            page += 1
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Qarzdorliklarni olishda xatolik: {e}")
+            data = response.json()['data']
+            token = data['access_token']
+        except (httpx.HTTPError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Access token olishda xatolik: {e}")
+            self.token, self.expires_at = None, 0.0
+            return None
+
+        self.token, self.expires_at = token, get_token_expiry(data, token)
+        self.logins += 1
+        logger.info(f"Access token muvaffaqiyatli olindi (amal qilish muddati: {self.expires_at - time.time():.0f} s).")
+        return token
+
+token_manager = AccessTokenManager()
+
+async def get_access_token():
+    """BILLZ API access tokeni (keshdan yoki yangi login)"""
+    return await token_manager.get()
+
+def auth_headers(token: Optional[str]) -> dict:
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+async def billz_get(client, url, params=None):
+    """GET so'rov access token bilan; 401 javobida token bir marta yangilanib, so'rov takrorlanadi"""
+    token = await token_manager.get()
+    response = await client.get(url, params=params, headers=auth_headers(token))
+    if response.status_code == 401:
+        logger.warning("Access token rad etildi (401) - yangisi olinib, so'rov takrorlanadi")
+        token = await token_manager.refresh(token)
+        if token is not None:
+            response = await client.get(url, params=params, headers=auth_headers(token))
+    response.raise_for_status()
+    return response
+
+def is_retryable(error: Exception) -> bool:
+    """Qayta urinish foyda berishi mumkin bo'lgan xatolar: tarmoq, 429/5xx, buzilgan javob"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRY_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, ValueError))
+
+def get_retry_delay(attempt: int, error: Exception) -> float:
+    """Eksponensial kutish + tasodifiy qo'shimcha; 429 da Retry-After hisobga olinadi"""
+    delay = min(FETCH_RETRY_MAX_DELAY, FETCH_RETRY_DELAY * 2 ** attempt)
+    if isinstance(error, httpx.HTTPStatusError):
+        try:
+            delay = max(delay, min(FETCH_RETRY_MAX_DELAY, float(error.response.headers.get('Retry-After', 0))))
+        except ValueError:
+            pass
+    return delay + random.uniform(0, FETCH_RETRY_DELAY)
+
+async def fetch_debt_page(client, page, params=None, stats=None):
+    """Bitta sahifadagi qarzdorliklarni olish (to'liq javob bilan), vaqtinchalik xatolarda qayta urinib"""
+    if stats is not None:
+        # So'rov yuborilishi bilan sanaladi - oxiridan keyin oldindan so'ralib, so'ng bekor qilingan
+        # (bo'sh) sahifalar ham trafik, tejalgan sahifalar shu son bo'yicha hisoblanadi
+        stats['pages'] = stats.get('pages', 0) + 1
+    attempt = 0
+    while True:
+        try:
+            response = await billz_get(client, f"{BASE_URL}/debt", {"page": page, "limit": PAGE_LIMIT, **(params or {})})
+            payload = response.json()
             break
-    logger.info(f"Jami {len(all_debts_data)} ta qarzdorlik olindi.")
+        except (httpx.HTTPError, ValueError) as e:
+            if attempt >= FETCH_MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = get_retry_delay(attempt, e)
+            attempt += 1
+            logger.warning(f"Sahifa {page}: {e} - {delay:.1f} s dan keyin qayta uriniladi ({attempt}/{FETCH_MAX_RETRIES})")
+            if stats is not None:
+                stats['retries'] = stats.get('retries', 0) + 1
+            await asyncio.sleep(delay)
+
+    if stats is not None:
+        stats['bytes'] = stats.get('bytes', 0) + len(response.content)
+    return payload
+
+class SyncCheckpoint:
+    """
+    Tugallanmagan sinxronlashning nazorat nuqtasi. Xom sahifalar emas, qayta ishlangan
+    bo'laklar saqlanadi: to'liq yuklashda sotuvchilar bo'yicha guruhlangan qatorlar,
+    qisman yangilashda faqat o'zgargan qarzlar - har biri qaysi sahifalardan olingani bilan
+    (sahifa kursori) SYNC_CHECKPOINT_PAGES_FILE ga qo'shib boriladi. SYNC_CHECKPOINT_FILE da
+    so'rov kaliti (rejim va filtr) saqlanadi. Xuddi shu so'rov bilan qayta urinilganda bo'laklar
+    qayta o'qiladi va yuklash keyingi sahifadan davom etadi. Sinxronlash yakunlanganda o'chiriladi.
+    """
+
+    def __init__(self, key: dict, meta_file: str = SYNC_CHECKPOINT_FILE, pages_file: str = SYNC_CHECKPOINT_PAGES_FILE):
+        self.key = key
+        self.meta_file = meta_file
+        self.pages_file = pages_file
+        self.next_page = 1
+        self.total_pages: Optional[int] = None
+        self.created_at = time.time()
+        self._meta_saved = False
+
+    @classmethod
+    def open(cls, key: dict, **files) -> "SyncCheckpoint":
+        """Mos nazorat nuqtasini ochish; mos kelmasa yoki eskirgan bo'lsa - yangisini boshlash"""
+        checkpoint = cls(key, **files)
+        meta = load_json(checkpoint.meta_file)
+        if (meta.get('key') == key and os.path.exists(checkpoint.pages_file)
+                and time.time() - meta.get('created_at', 0) <= SYNC_CHECKPOINT_MAX_AGE):
+            checkpoint.total_pages = meta.get('total_pages')
+            checkpoint.created_at = meta['created_at']
+            checkpoint._meta_saved = True
+        else:
+            checkpoint.clear()
+        return checkpoint
+
+    def replay(self):
+        """
+        Saqlangan bo'laklar tartib bilan: (ma'lumot, xom yozuvlar soni, high-water mark).
+        next_page oxirgi to'liq bo'lakdan keyingi sahifaga o'rnatiladi; yarim yozilgan
+        yoki mos kelmaydigan qatorlar fayldan kesib tashlanadi.
+        """
+        expected = 1
+        valid_end = 0
+        if os.path.exists(self.pages_file):
+            with open(self.pages_file, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # Oxirgi qator yarim yozilgan
+                    if not isinstance(record, dict) or record.get('from') != expected:
+                        break
+                    yield record['data'], record.get('records', 0), record.get('high_water_mark')
+                    expected = record['to'] + 1
+                    valid_end = f.tell()
+            if os.path.getsize(self.pages_file) > valid_end:
+                with open(self.pages_file, 'r+b') as f:
+                    f.truncate(valid_end)
+        self.next_page = expected
+
+    def add(self, first_page: int, last_page: int, data, records: int, high_water_mark: Optional[str],
+            total_pages: Optional[int]):
+        """
+        Qayta ishlangan bo'lakni qo'shish. fsync qilinmaydi: uzilishda yo'qolgan yoki yarim
+        qolgan qator replay() da tashlab yuboriladi va o'sha sahifalar qaytadan olinadi.
+        """
+        if not self._meta_saved:
+            save_json({'key': self.key, 'total_pages': total_pages, 'created_at': self.created_at}, self.meta_file)
+            self._meta_saved = True
+        record = {'from': first_page, 'to': last_page, 'records': records, 'high_water_mark': high_water_mark, 'data': data}
+        with open(self.pages_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.next_page = last_page + 1
+        self.total_pages = total_pages
+
+    def clear(self):
+        for filename in (self.meta_file, self.pages_file):
+            if os.path.exists(filename):
+                os.remove(filename)
+        self._meta_saved = False
+
+def get_total_pages(payload):
+    """Javobdagi umumiy son bo'yicha sahifalar sonini aniqlash (agar API bersa)"""
+    total = payload.get('count', payload.get('total'))
+    if isinstance(total, int) and total >= 0:
+        return math.ceil(total / PAGE_LIMIT)
+    return None
+
+async def iter_debt_pages(params=None, stats=None, start_page: int = 1, skip_ids=None, total_pages: Optional[int] = None):
+    """
+    Qarzdorlik sahifalarini tartib bilan birma-bir (sahifa raqami, qarzlar) qaytaruvchi generator.
+    Bir vaqtda FETCH_CONCURRENCY tagacha sahifa olinadi, xotirada esa faqat
+    shu oynadagi sahifalar turadi - qayta ishlangan sahifa darhol tashlab yuboriladi.
+    Davom ettirilgan yuklashda (start_page > 1) skip_ids dagi qarzlar ID bo'yicha olib
+    tashlanadi - oradagi o'zgarishlar sabab siljigan yozuvlar ikki marta sanalmaydi;
+    total_pages - avvalgi urinishda ma'lum bo'lgan sahifalar soni (API bermasa).
+    Qayta urinishlardan keyin ham sahifa olinmasa stats['complete'] = False bo'ladi.
+    """
+    client = get_http_client()
+    total_count = 0
+    logger.info("Qarzdorliklarni olish jarayoni boshlandi...")
+
+    skip_ids = skip_ids or set()
+
+    async def fetch(page):
+        payload = await fetch_debt_page(client, page, params, stats)
+        return payload.get('data', [])
+
+    try:
+        first_payload = await fetch_debt_page(client, start_page, params, stats)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"Qarzdorliklarni olishda xatolik (sahifa {start_page}): {e}")
+        if stats is not None:
+            stats['complete'] = False
+            if isinstance(e, httpx.HTTPStatusError):
+                # Birinchi so'rovning o'zi rad etildi - chaqiruvchi filtrni tekshirishi uchun
+                stats['rejected_status'] = e.response.status_code
+        return
+
+    data = first_payload.get('data', [])
+    # API umumiy sonni bersa - shuncha sahifa, aks holda bo'sh sahifa chiqquncha oldinga qarab olamiz
+    total_pages = get_total_pages(first_payload) or total_pages
+    del first_payload
+    if stats is not None and total_pages is not None:
+        stats['total_pages'] = total_pages
+
+    tasks = {}
+    next_page = start_page + 1
+
+    def schedule():
+        nonlocal next_page
+        while len(tasks) < FETCH_CONCURRENCY and (total_pages is None or next_page <= total_pages):
+            tasks[next_page] = asyncio.create_task(fetch(next_page))
+            next_page += 1
+
+    page = start_page
+    try:
+        while data:
+            schedule()
+            # Bo'sh qolgan sahifa ham yuklashni to'xtatmaydi - sikl xom sahifa bo'yicha davom etadi
+            fresh = [debt for debt in data if get_debt_id(debt) not in skip_ids] if skip_ids else data
+            if stats is not None and len(fresh) < len(data):
+                stats['duplicates'] = stats.get('duplicates', 0) + len(data) - len(fresh)
+            total_count += len(fresh)
+            logger.info(f"Sahifa {page}: {len(fresh)} ta qarz olindi. Jami: {total_count}")
+            yield page, fresh
+
+            page += 1
+            if page not in tasks:
+                break
+            try:
+                data = await tasks.pop(page)
+            except (httpx.HTTPError, ValueError) as e:
+                logger.error(f"Qarzdorliklarni olishda xatolik (sahifa {page}): {e}")
+                if stats is not None:
+                    stats['complete'] = False
+                break
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    logger.info(f"Jami {total_count} ta qarzdorlik olindi.")
+
+async def fetch_all_debts(params=None, stats=None):
+    """Barcha qarzdorliklarni bitta ro'yxatga olish (sahifalar parallel, tartib saqlanadi)"""
+    all_debts_data = []
+    async for _, data in iter_debt_pages(params, stats):
+        all_debts_data.extend(data)
     return all_debts_data
 
-def process_debt_data(all_debts_data):
-    """Qarzdorlik ma'lumotlarini qayta ishlash va Excel formatiga tayyorlash"""
-    logger.info("Ma'lumotlarni qayta ishlash boshlandi...")
-    processed_data = {}
-    today = datetime.now(TZ_UZB).date()
+def get_debt_id(debt):
+    """Qarzdorlikning barqaror identifikatori"""
+    return str(debt.get('id') or debt.get('order_number') or '')
 
-    status_translation = {
-        'partial_paid': 'Частично оплачен',
-        'unpaid': 'Не оплачен',
-        'overdue': 'Просрочен'
-    }
+def has_debt_id(debt_id) -> bool:
+    """Haqiqiy identifikator (bo'sh yoki 'N/A' bo'yicha yozuvlarni birlashtirib bo'lmaydi)"""
+    return bool(debt_id) and debt_id != 'N/A'
 
-    for debt in all_debts_data:
-        debt_status = debt.get('status')
-        if debt_status == 'fully_paid':
-            continue
+def is_filter_rejected(status_code: Optional[int]) -> bool:
+    """Filtrli so'rov rad etilgani (4xx) - token (401) va cheklov (429) xatolaridan tashqari"""
+    return status_code is not None and 400 <= status_code < 500 and status_code not in (401, 408, 429)
+
+def is_full_sync_due(sync_state: dict, now: datetime) -> bool:
+    """Oxirgi to'liq yuklashdan FULL_SYNC_INTERVAL o'tganmi (yoki hali bo'lmaganmi)"""
+    try:
+        last_full_sync = datetime.fromisoformat(sync_state['last_full_sync'])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return (now - last_full_sync).total_seconds() >= FULL_SYNC_INTERVAL
 
-        created_by = debt.get('created_by', {})
-        seller_name = f"{created_by.get('first_name', '')} {created_by.get('last_name', '')}".strip() or "Noma'lum"
+def get_debt_timestamp(debt):
+    """Qarzdorlik oxirgi o'zgargan vaqt (high-water mark uchun)"""
+    return debt.get('updated_at') or debt.get('created_at') or ''
 
-        # Sotuvchi bo'yicha guruhlash uchun
-        if not seller_name or seller_name == "Noma'lum":
-            continue
+def format_created_at(created_at_str):
+    """Yaratilgan vaqt (ISO, mahalliy vaqt deb olinadi) -> Toshkent bo'yicha 'YYYY-MM-DD'"""
+    try:
+        return datetime.fromisoformat(created_at_str.replace('Z', '')).astimezone(TZ_UZB).strftime('%Y-%m-%d')
+    except (ValueError, TypeError):
+        return created_at_str.split('T')[0] if 'T' in str(created_at_str) else created_at_str
 
-        debt_amount = debt.get('amount', 0)
-        paid_amount = debt.get('paid_amount', 0)
-        unpaid_amount = debt_amount - paid_amount
+def parse_repayment_date(repayment_date_str, today):
+    """To'lov muddati -> ('YYYY-MM-DD', kun raqami yoki None, "Muddati" matni)"""
+    try:
+        repayment_date_obj = datetime.fromisoformat(repayment_date_str.replace('Z', '')).date()
+        due_day = repayment_date_obj.toordinal()
+        return repayment_date_obj.strftime('%Y-%m-%d'), due_day, get_deadline_text(due_day - today.toordinal())
+    except (ValueError, TypeError):
+        repayment_date = repayment_date_str.split('T')[0] if 'T' in str(repayment_date_str) else repayment_date_str
+        return repayment_date, None, "N/A"
 
-        created_at_str = debt.get('created_at', '')
-        repayment_date_str = debt.get('repayment_date', '')
-        days_diff_text = "N/A"
+def process_debt(debt, today):
+    """
+    Bitta qarzdorlikni qayta ishlash.
+    To'liq to'langan yoki sotuvchisi noma'lum qarzlar uchun None qaytaradi.
+    """
+    debt_status = debt.get('status')
+    if debt_status == 'fully_paid':
+        return None
 
-        # Mijoz ismini ham olamiz, botdagi matnli xabarlar uchun kerak bo'ladi
-        customer = debt.get('customer', {})
-        client_name = f"{customer.get('first_name', '')} {customer.get('last_name', '')}".strip() or "Noma'lum mijoz"
+    created_by = debt.get('created_by', {})
+    seller_name = f"{created_by.get('first_name', '')} {created_by.get('last_name', '')}".strip() or "Noma'lum"
 
-        try:
-            created_at = datetime.fromisoformat(created_at_str.replace('Z', '')).astimezone(TZ_UZB).strftime('%Y-%m-%d')
-        except (ValueError, TypeError):
-            created_at = created_at_str.split('T')[0] if 'T' in str(created_at_str) else created_at_str
+    # Sotuvchi bo'yicha guruhlash uchun
+    if not seller_name or seller_name == "Noma'lum":
+        return None
 
-        try:
-            repayment_date_obj = datetime.fromisoformat(repayment_date_str.replace('Z', '')).date()
-            repayment_date = repayment_date_obj.strftime('%Y-%m-%d')
-            days_diff = (repayment_date_obj - today).days
-
-            if days_diff < 0:
-                days_diff_text = f"{abs(days_diff)} kun o'tdi"
-            elif days_diff == 0:
-                days_diff_text = "Bugun"
-            else:
-                days_diff_text = f"{days_diff} kun qoldi"
-        except (ValueError, TypeError):
-            repayment_date = repayment_date_str.split('T')[0] if 'T' in str(repayment_date_str) else repayment_date_str
-
-        debt_info = {
-            # Excel uchun ustunlar
-            'Chek Raqami': debt.get('order_number', 'N/A'),
-            'Sotuvchi Ismi': seller_name,
-            'Yaratilgan Sana': created_at,
-            'Qarz Summasi': debt_amount,
-            'To\'langan Summa': paid_amount,
-            'Qolgan Summa': unpaid_amount,
-            'Qarz Statusi': status_translation.get(debt_status, debt_status),
-            'To\'lov Muddati': repayment_date,
-            'Muddati': days_diff_text,
-            'Mijoz Telefoni': ", ".join(debt.get('contact_phones', []) or ["N/A"]),
-            # Botda matnli xabar uchun qo'shimcha ma'lumot
-            'Mijoz Ismi': client_name,
-        }
+    debt_amount = debt.get('amount', 0)
+    paid_amount = debt.get('paid_amount', 0)
+    unpaid_amount = debt_amount - paid_amount
+
+    # Mijoz ismini ham olamiz, botdagi matnli xabarlar uchun kerak bo'ladi
+    customer = debt.get('customer', {})
+    client_name = f"{customer.get('first_name', '')} {customer.get('last_name', '')}".strip() or "Noma'lum mijoz"
+
+    created_at = format_created_at(debt.get('created_at', ''))
+    repayment_date, due_day, days_diff_text = parse_repayment_date(debt.get('repayment_date', ''), today)
+
+    return {
+        # Excel uchun ustunlar
+        'Chek Raqami': debt.get('order_number', 'N/A'),
+        'Sotuvchi Ismi': seller_name,
+        'Yaratilgan Sana': created_at,
+        'Qarz Summasi': debt_amount,
+        'To\'langan Summa': paid_amount,
+        'Qolgan Summa': unpaid_amount,
+        'Qarz Statusi': STATUS_TRANSLATION.get(debt_status, debt_status),
+        'To\'lov Muddati': repayment_date,
+        'Muddati': days_diff_text,
+        # Saralash/filtrlash uchun muddat kun raqami ("Muddati" matnini qayta tahlil qilmaslik uchun)
+        DUE_DAY_KEY: due_day,
+        'Mijoz Telefoni': ", ".join(debt.get('contact_phones', []) or ["N/A"]),
+        # Botda matnli xabar uchun qo'shimcha ma'lumot
+        'Mijoz Ismi': client_name,
+        # Qisman yangilashda yozuvlarni birlashtirish uchun
+        'ID': get_debt_id(debt),
+    }
+
+def add_processed_debts_loop(processed_data, debts, today):
+    """Qarzdorliklarni birma-bir qayta ishlab, sotuvchilar bo'yicha guruhlangan natijaga qo'shish"""
+    for debt in debts:
+        debt_info = process_debt(debt, today)
+        if debt_info is None:
+            continue
 
+        seller_name = debt_info['Sotuvchi Ismi']
         if seller_name not in processed_data:
             processed_data[seller_name] = []
         processed_data[seller_name].append(debt_info)
 
+# --- USTUNLI (VEKTORLASHTIRILGAN) QAYTA ISHLASH ---
+# Shundan kam qatorlarni DataFrame ga aylantirish sikldan sekinroq
+VECTORIZE_MIN_ROWS = int(os.getenv("VECTORIZE_MIN_ROWS", "2000"))
+# Tez yo'l faqat shu ko'rinishdagi sanalar uchun; qolganlari process_debt dagi funksiyalar bilan
+ISO_DATETIME_PATTERN = r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?Z?$'
+
+def column(debts, key, default):
+    return pd.Series([debt.get(key, default) for debt in debts], dtype=object)
+
+def full_name(records, default):
+    """f"{first_name} {last_name}".strip() or default - butun ustun uchun"""
+    first_names = pd.Series([record.get('first_name', '') for record in records], dtype=object)
+    last_names = pd.Series([record.get('last_name', '') for record in records], dtype=object)
+    names = (first_names.astype(str) + ' ' + last_names.astype(str)).str.strip()
+    return names.mask(names == '', default)
+
+def parse_iso_column(values: pd.Series, pattern: str) -> pd.Series:
+    """Naqshga mos satrlarni datetime ga ('Z' olib tashlanadi), qolganlari NaT"""
+    try:
+        matches = values.str.match(pattern).fillna(False).astype(bool)
+    except AttributeError:  # Ustunda birorta ham satr yo'q
+        matches = pd.Series(False, index=values.index)
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    if matches.any():
+        parsed[matches] = pd.to_datetime(values[matches].str.replace('Z', '', regex=False), format='ISO8601', errors='coerce')
+    return parsed
+
+def created_at_column(values: pd.Series) -> list:
+    """format_created_at ning ustunli varianti: mahalliy vaqt -> Toshkent sanasi"""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return created_at_dates(pd.Series(uniques, dtype=object)).to_numpy()[codes].tolist()
+
+def created_at_dates(values: pd.Series) -> pd.Series:
+    parsed = parse_iso_column(values, ISO_DATETIME_PATTERN)
+    result = pd.Series(None, index=values.index, dtype=object)
+    valid = parsed.notna()
+    if valid.any():
+        # datetime.astimezone() kabi: vaqt zonasisiz qiymat server vaqti deb olinadi
+        # (yozgi vaqtga o'tishdagi noaniq soatlar NaT bo'lib, pastda alohida hisoblanadi)
+        localized = parsed[valid].dt.tz_localize(tzlocal(), ambiguous='NaT', nonexistent='NaT').dropna()
+        days = localized.dt.tz_convert(TZ_UZB).dt.tz_localize(None).to_numpy().astype('datetime64[D]')
+        result[localized.index] = days.astype(str).tolist()
+    fallback = result.isna()
+    if fallback.any():
+        result[fallback] = values[fallback].map(format_created_at)
+    return result
+
+def repayment_columns(values: pd.Series, today) -> Tuple[list, list, list]:
+    """
+    parse_repayment_date ning ustunli varianti: (sana matni, kun raqami, "Muddati" matni).
+    To'lov sanalari ko'p takrorlanadi - har bir takrorlanmas qiymat bir marta hisoblanadi.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    parts = [parse_repayment_date(value, today) for value in uniques]
+    return tuple(np.array([part[i] for part in parts], dtype=object)[codes].tolist() for i in range(3))
+
+def amount_columns(debts) -> Tuple[list, list, list]:
+    """Qarz, to'langan va qolgan summalar (butun sonlar butunligicha qoladi)"""
+    amounts = [debt.get('amount', 0) for debt in debts]
+    paid = [debt.get('paid_amount', 0) for debt in debts]
+    amount_array, paid_array = np.array(amounts), np.array(paid)
+    if amount_array.dtype.kind == 'i' and paid_array.dtype.kind == 'i':
+        return amounts, paid, (amount_array - paid_array).tolist()
+    # Aralash turlar - Python amallari bilan: natija turi va noto'g'ri qiymatlardagi (None, matn)
+    # xatolik process_debt bilan bir xil, pandas kabi jimgina NaN bo'lmaydi
+    return amounts, paid, [amount - paid_amount for amount, paid_amount in zip(amounts, paid)]
+
+def debts_frame(debts, today) -> pd.DataFrame:
+    """
+    Xom qarzdorliklarni DataFrame ga aylantirish: sanalar, kunlar farqi, status tarjimasi
+    ustunlar bo'yicha bir martada. Ustunlar tartibi process_debt natijasi bilan bir xil,
+    to'liq to'langan va sotuvchisi noma'lum qarzlar olib tashlanadi.
+    """
+    statuses = column(debts, 'status', None)
+    # To'liq to'langanlarning sotuvchisi process_debt dagi kabi umuman o'qilmaydi
+    sellers = full_name([
+        debt.get('created_by', {}) if status != 'fully_paid' else {} for debt, status in zip(debts, statuses)
+    ], "Noma'lum")
+    keep = (statuses != 'fully_paid') & (sellers != "Noma'lum")
+    if not keep.all():
+        positions = np.flatnonzero(keep.to_numpy())
+        debts = [debts[i] for i in positions]
+        statuses, sellers = statuses[keep].reset_index(drop=True), sellers[keep].reset_index(drop=True)
+
+    amounts, paid, unpaid = amount_columns(debts)
+    repayment_dates, due_days, deadlines = repayment_columns(column(debts, 'repayment_date', ''), today)
+    # ", ".join Python da - ro'yxatdagi None yoki son process_debt dagi kabi xatolik beradi
+    phones = [", ".join(debt.get('contact_phones', []) or ["N/A"]) for debt in debts]
+
+    return pd.DataFrame({
+        'Chek Raqami': column(debts, 'order_number', 'N/A'),
+        'Sotuvchi Ismi': sellers,
+        'Yaratilgan Sana': pd.Series(created_at_column(column(debts, 'created_at', '')), dtype=object),
+        'Qarz Summasi': pd.Series(amounts, dtype=object),
+        'To\'langan Summa': pd.Series(paid, dtype=object),
+        'Qolgan Summa': pd.Series(unpaid, dtype=object),
+        'Qarz Statusi': statuses.replace(STATUS_TRANSLATION),
+        'To\'lov Muddati': pd.Series(repayment_dates, dtype=object),
+        'Muddati': pd.Series(deadlines, dtype=object),
+        DUE_DAY_KEY: pd.Series(due_days, dtype=object),
+        'Mijoz Telefoni': pd.Series(phones, dtype=object),
+        'Mijoz Ismi': full_name([debt.get('customer', {}) for debt in debts], "Noma'lum mijoz"),
+        'ID': pd.Series([get_debt_id(debt) for debt in debts], dtype=object),
+    })
+
+def add_processed_debts_columnar(processed_data, debts, today):
+    """Qarzdorliklarni ustunlar bo'yicha qayta ishlab, sotuvchilar bo'yicha guruhlangan natijaga qo'shish"""
+    if not debts:
+        return
+    df = debts_frame(debts, today)
+    # Ustunlar oddiy Python qiymatlari (object) - qatorlar to_dict('records') siz, zip bilan yig'iladi
+    keys = list(df.columns)
+    records = [dict(zip(keys, row)) for row in zip(*(df[key].tolist() for key in keys))]
+    for seller_name, positions in df.groupby('Sotuvchi Ismi', sort=False).indices.items():
+        processed_data.setdefault(seller_name, []).extend(records[i] for i in positions)
+
+def add_processed_debts(processed_data, debts, today):
+    """
+    Qarzdorliklarni qayta ishlab, sotuvchilar bo'yicha guruhlangan natijaga qo'shish.
+    Katta to'plamlar ustunlar bo'yicha, kichiklari (DataFrame xarajati ortiq) birma-bir - natija bir xil.
+    """
+    if len(debts) < VECTORIZE_MIN_ROWS:
+        add_processed_debts_loop(processed_data, debts, today)
+    else:
+        add_processed_debts_columnar(processed_data, debts, today)
+
+def process_debt_data(all_debts_data):
+    """Qarzdorlik ma'lumotlarini qayta ishlash va Excel formatiga tayyorlash"""
+    logger.info("Ma'lumotlarni qayta ishlash boshlandi...")
+    processed_data = {}
+    add_processed_debts(processed_data, all_debts_data, datetime.now(TZ_UZB).date())
+
     logger.info(f"Ma'lumotlarni qayta ishlash yakunlandi. Jami sotuvchilar: {len(processed_data)}")
     return processed_data
 
-async def update_data_from_billz():
-    """BILLZ API dan ma'lumotlarni yangilash - asosiy funksiya"""
+def merge_debt_changes(processed_data, changed_debts):
+    """
+    O'zgargan qarzdorliklarni mavjud ma'lumotlarga qo'shish.
+    To'liq to'langanlari o'chiriladi, qolganlarining 'Muddati' bugungi sanaga qayta hisoblanadi.
+
+    Identifikatorsiz qarzlar bu yerga kelmasligi kerak (chaqiruvchi to'liq yuklaydi) -
+    aks holda ular bitta kalitga tushib, bittasidan boshqasi yo'qolardi.
+
+    Returns:
+        tuple: (yangi_ma'lumotlar, yangilangan_soni, o'chirilgan_soni)
+    """
+    today = datetime.now(TZ_UZB).date()
+    debts_by_id = {}
+    for debts in processed_data.values():
+        for debt_info in debts:
+            debts_by_id[debt_info['ID']] = dict(debt_info)
+
+    updated_count = removed_count = 0
+    for debt in changed_debts:
+        debt_id = get_debt_id(debt)
+        if not has_debt_id(debt_id):
+            raise ValueError("Identifikatorsiz qarzdorlikni birlashtirib bo'lmaydi")
+        debt_info = process_debt(debt, today)
+        if debt_info is None:
+            if debts_by_id.pop(debt_id, None) is not None:
+                removed_count += 1
+            continue
+        debts_by_id[debt_id] = debt_info
+        updated_count += 1
+
+    merged_data = {}
+    for debt_info in debts_by_id.values():
+        if DUE_DAY_KEY not in debt_info:
+            debt_info[DUE_DAY_KEY] = parse_due_day(debt_info.get('To\'lov Muddati'))
+        if debt_info[DUE_DAY_KEY] is not None:
+            debt_info['Muddati'] = get_deadline_text(debt_info[DUE_DAY_KEY] - today.toordinal())
+        merged_data.setdefault(debt_info['Sotuvchi Ismi'], []).append(debt_info)
+
+    return merged_data, updated_count, removed_count
+
+def get_high_water_mark(all_debts_data, previous=None):
+    """Olingan yozuvlar ichidagi eng so'nggi o'zgarish vaqti"""
+    timestamps = [get_debt_timestamp(debt) for debt in all_debts_data]
+    return max([t for t in timestamps if t] + ([previous] if previous else []), default=previous)
+
+def get_last_sync_stats():
+    """Oxirgi muvaffaqiyatli sinxronlash statistikasi"""
+    return dict(last_sync_stats)
+
+def get_sync_progress():
+    """
+    Joriy sinxronlash holati: stage ('token', 'fetch', 'save', 'done', 'failed'),
+    pages (olingan sahifalar), total_pages (API bersa), records (qayta ishlangan yozuvlar)
+    """
+    return dict(sync_progress)
+
+def publish_processed_data(processed_data: dict):
+    """Qayta ishlangan ma'lumotlarni saqlash va ombordagi nusxani almashtirish"""
+    return store.publish(processed_data, DATA_FILE, store.compute_aggregates(processed_data))
+
+async def update_data_from_billz(full=False):
+    """
+    BILLZ API dan ma'lumotlarni yangilash - asosiy funksiya
+
+    Args:
+        full: True bo'lsa barcha qarzdorliklar qaytadan yuklanadi, aks holda
+              faqat oxirgi sinxronlashdan keyin o'zgarganlari olinadi. Oxirgi to'liq
+              yuklashdan FULL_SYNC_INTERVAL o'tgan bo'lsa, BILLZ filtrni rad etgan bo'lsa
+              yoki identifikatorsiz qarz kelsa ham to'liq yuklanadi.
+    """
+    global last_sync_stats, sync_progress
     logger.info("🔄 Ma'lumotlarni yangilash jarayoni boshlandi...")
+    started = datetime.now(TZ_UZB)
+    sync_progress = {'stage': 'token', 'pages': 0, 'records': 0}
     try:
-        access_token = await get_access_token()
+        access_token = await token_manager.get()
         if not access_token:
             logger.error("❌ Access token olinmadi - jarayon to'xtatildi.")
+            sync_progress['stage'] = 'failed'
             return False
 
-        all_debts_data = await fetch_all_debts(access_token)
-        if not all_debts_data:
+        sync_state = load_json(SYNC_STATE_FILE)
+        high_water_mark = sync_state.get('high_water_mark')
+        current = store.get_snapshot(DATA_FILE)
+        if not full and high_water_mark and is_full_sync_due(sync_state, started):
+            logger.info("Oxirgi to'liq yuklashdan beri ko'p vaqt o'tdi - serverdagi holat bilan to'liq solishtiriladi")
+        incremental = (
+            not full and high_water_mark and current
+            # Rad etilgan parametr nomi eslab qolinadi - BILLZ_UPDATED_SINCE_PARAM o'zgartirilsa qayta sinab ko'riladi
+            and sync_state.get('unsupported_filter') != UPDATED_SINCE_PARAM
+            and not is_full_sync_due(sync_state, started)
+            and all(has_debt_id(debt.get('ID')) for debt in current.all_debts)
+        )
+
+        stats = {'mode': 'incremental' if incremental else 'full', 'stage': 'fetch', 'pages': 0, 'records': 0}
+        sync_progress = stats
+        params = {UPDATED_SINCE_PARAM: high_water_mark} if incremental else None
+
+        # Qayta ishlangan bo'laklar nazorat nuqtasiga yoziladi - uzilib qolsa, keyingi urinish shu joydan davom etadi
+        checkpoint = SyncCheckpoint.open({'mode': stats['mode'], 'params': params})
+
+        processed_data, changed_debts = {}, []
+        record_count, page_high_water_mark = 0, None
+        seen_ids = set()
+        for data, records, chunk_high_water_mark in checkpoint.replay():
+            record_count += records
+            page_high_water_mark = max(filter(None, [page_high_water_mark, chunk_high_water_mark]), default=None)
+            if incremental:
+                changed_debts.extend(data)
+                seen_ids.update(get_debt_id(debt) for debt in data)
+            else:
+                for seller_name, rows in data.items():
+                    processed_data.setdefault(seller_name, []).extend(rows)
+                    seen_ids.update(row['ID'] for row in rows)
+        seen_ids.discard('')
+        if checkpoint.next_page > 1:
+            stats['resumed_pages'] = checkpoint.next_page - 1
+            stats['records'] = record_count
+            logger.info(
+                f"Tugallanmagan sinxronlash davom ettirilmoqda: {checkpoint.next_page - 1} ta sahifa saqlangan "
+                f"({record_count} ta qarz)"
+            )
+
+        # Sahifalar VECTORIZE_MIN_ROWS gacha yig'iladi (ustunli qayta ishlash katta to'plamda tezroq),
+        # qayta ishlangach nazorat nuqtasiga yoziladi va xom sahifalar darhol tashlab yuboriladi
+        today = datetime.now(TZ_UZB).date()
+        batch, batch_first_page, batch_last_page = [], None, None
+
+        async def flush():
+            nonlocal batch, batch_first_page, page_high_water_mark
+            if batch_first_page is None:
+                return
+            batch_high_water_mark = get_high_water_mark(batch)
+            if incremental:
+                # Filtr qo'llab-quvvatlanmasa ham faqat haqiqatan o'zgarganlarini birlashtiramiz
+                chunk = [debt for debt in batch if get_debt_timestamp(debt) > high_water_mark]
+                changed_debts.extend(chunk)
+            else:
+                chunk = {}
+                add_processed_debts(chunk, batch, today)
+                for seller_name, rows in chunk.items():
+                    processed_data.setdefault(seller_name, []).extend(rows)
+            # Diskka yozish hodisalar siklini to'xtatmasligi uchun ishchi oqimda
+            await asyncio.to_thread(
+                checkpoint.add, batch_first_page, batch_last_page, chunk, len(batch),
+                batch_high_water_mark, stats.get('total_pages'),
+            )
+            page_high_water_mark = max(filter(None, [page_high_water_mark, batch_high_water_mark]), default=None)
+            batch, batch_first_page = [], None
+
+        async for page, page_data in iter_debt_pages(
+                params, stats, checkpoint.next_page, seen_ids, checkpoint.total_pages):
+            record_count += len(page_data)
+            stats['records'] = record_count
+            if batch_first_page is None:
+                batch_first_page = page
+            batch_last_page = page
+            batch.extend(page_data)
+            if len(batch) >= VECTORIZE_MIN_ROWS:
+                await flush()
+        # Uzilgan yuklashda ham olingan sahifalar saqlanadi - keyingi urinish ularni qayta so'ramaydi
+        await flush()
+
+        if incremental and not stats.get('complete', True) and is_filter_rejected(stats.get('rejected_status')):
+            # Filtr parametri BILLZ da yo'q - eslab qolinadi, keyingi yangilashlar ham to'liq bo'ladi
+            logger.warning(
+                f"⚠️ BILLZ '{UPDATED_SINCE_PARAM}' filtrini rad etdi ({stats['rejected_status']}) - "
+                f"qisman yangilash o'chirildi, to'liq yuklanadi."
+            )
+            checkpoint.clear()
+            save_json({**sync_state, 'unsupported_filter': UPDATED_SINCE_PARAM}, SYNC_STATE_FILE)
+            return await update_data_from_billz(full=True)
+
+        if not stats.get('complete', True):
+            # Qisman yuklangan ma'lumotlar saqlanmaydi - aks holda olinmagan qarzlar yo'qolib qoladi
+            logger.error(
+                f"❌ Yuklash to'liq emas ({checkpoint.next_page - 1} ta sahifa saqlandi) - ma'lumotlar o'zgartirilmadi, "
+                f"keyingi urinish shu joydan davom etadi."
+            )
+            stats['stage'] = 'failed'
+            return False
+
+        if incremental and not all(has_debt_id(get_debt_id(debt)) for debt in changed_debts):
+            logger.warning("⚠️ Identifikatorsiz qarzdorlik olindi - birlashtirish o'rniga to'liq yuklanadi.")
+            checkpoint.clear()
+            return await update_data_from_billz(full=True)
+
+        if incremental:
+            processed_data, updated_count, removed_count = await asyncio.to_thread(merge_debt_changes, current.data, changed_debts)
+            stats.update(updated=updated_count, removed=removed_count)
+        elif not record_count:
             logger.warning("⚠️ Hech qanday qarzdorlik ma'lumoti olinmadi.")
-            save_json({}, DATA_FILE)
-            return True
+        else:
+            logger.info(f"Ma'lumotlarni qayta ishlash yakunlandi. Jami sotuvchilar: {len(processed_data)}")
+
+        stats['stage'] = 'save'
+        # Saqlash, indekslar va boshqaruv paneli yig'indilari ishchi oqimda bir marta hisoblanadi -
+        # shu vaqtda bot eski nusxa bilan javob berishda davom etadi, tayyor bo'lgach nusxa almashtiriladi
+        await asyncio.to_thread(publish_processed_data, processed_data)
+        seconds = round((datetime.now(TZ_UZB) - started).total_seconds(), 1)
+        pages = stats.get('pages', 0)
+        new_high_water_mark = max(filter(None, [page_high_water_mark, high_water_mark if incremental else None]), default=None)
+        if incremental:
+            # Tejalgan trafik oxirgi to'liq yuklashga nisbatan (qisman yangilashdagi yozuvlar soni bo'yicha emas)
+            full_sync_pages, full_sync_seconds = sync_state.get('full_sync_pages'), sync_state.get('full_sync_seconds')
+        else:
+            # Davom ettirilgan yuklashda avvalgi urinishda olingan sahifalar ham hisobga olinadi
+            full_sync_pages, full_sync_seconds = pages + stats.get('resumed_pages', 0), seconds
+        save_json({
+            'high_water_mark': new_high_water_mark,
+            'last_full_sync': sync_state.get('last_full_sync') if incremental else started.isoformat(),
+            'full_sync_pages': full_sync_pages,
+            'full_sync_seconds': full_sync_seconds,
+            'unsupported_filter': sync_state.get('unsupported_filter'),
+        }, SYNC_STATE_FILE)
+        checkpoint.clear()
 
-        processed_data = process_debt_data(all_debts_data)
-        save_json(processed_data, DATA_FILE)
+        saved = incremental and full_sync_pages is not None
+        stats.update(
+            stage='done',
+            records=record_count,
+            total=sum(len(d) for d in processed_data.values()),
+            saved_pages=max(full_sync_pages - pages, 0) if saved else 0,
+            saved_seconds=round(max(full_sync_seconds - seconds, 0), 1) if saved and full_sync_seconds is not None else 0,
+            seconds=seconds,
+        )
+        last_sync_stats = stats
 
-        logger.info(f"✅ Ma'lumotlar muvaffaqiyatli yangilandi! ({len(processed_data)} ta sotuvchi)")
+        logger.info(
+            f"✅ Ma'lumotlar muvaffaqiyatli yangilandi! ({len(processed_data)} ta sotuvchi, "
+            f"rejim: {stats['mode']}, {stats.get('pages', 0)} sahifa / {stats.get('bytes', 0)} bayt, "
+            f"tejalgan sahifalar: {stats['saved_pages']} (~{stats['saved_seconds']} s), qayta urinishlar: {stats.get('retries', 0)}, "
+            f"davom ettirilgan sahifalar: {stats.get('resumed_pages', 0)}, "
+            f"takroriy yozuvlar: {stats.get('duplicates', 0)}, {stats['seconds']} s)"
+        )
         return True
     except Exception as e:
         logger.error(f"❌ Ma'lumotlarni yangilashda kutilmagan xatolik: {e}")
+        sync_progress['stage'] = 'failed'
         return False
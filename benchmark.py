@@ -0,0 +1,243 @@
+# benchmark.py - Sinxronlash va hisobotlar uchun o'lchovlar (BILLZ API o'rniga sun'iy ma'lumotlar)
+#
+# Foydalanish:
+#   python benchmark.py memory [--counts 1000 10000 50000 100000]
+#   python benchmark.py excel [--rows 1000 10000 100000]
+#   python benchmark.py transform [--rows 1000 10000 100000]
+#   python benchmark.py sync
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+# api_handler import qilinganda token talab qilinadi - o'lchov uchun soxta qiymat yetarli
+os.environ.setdefault("BILLZ_SECRET_TOKEN", "benchmark")
+
+FIRST_NAMES = ["Ahad", "Olim", "Shohida", "Aziz", "Dilnoza", "Bekzod", "Malika", "Jasur", "Nodira", "Sardor"]
+LAST_NAMES = ["Karimov", "Tursunova", "Aliyev", "Rahimov", "Usmonova", "Qodirov", "Ergashev", "Saidova"]
+SELLERS = [("Ali", "Valiyev"), ("Gulnora", "Saidova"), ("Rustam", "Ergashev"), ("Kamola", "Yusupova")]
+STATUSES = ["partial_paid", "unpaid", "overdue", "fully_paid"]
+
+def make_debt(i):
+    """BILLZ /debt javobidagi kabi bitta sun'iy qarzdorlik"""
+    rnd = random.Random(i)
+    repayment = date.today() + timedelta(days=rnd.randint(-90, 30))
+    amount = rnd.randint(1, 200) * 10000
+    seller = rnd.choice(SELLERS)
+    return {
+        "id": f"debt-{i}",
+        "order_number": str(100000 + i),
+        "status": rnd.choice(STATUSES),
+        "created_by": {"first_name": seller[0], "last_name": seller[1]},
+        "customer": {"first_name": rnd.choice(FIRST_NAMES), "last_name": rnd.choice(LAST_NAMES)},
+        "amount": amount,
+        "paid_amount": rnd.randint(0, amount),
+        "created_at": f"{repayment - timedelta(days=30)}T10:15:00Z",
+        "updated_at": f"{repayment - timedelta(days=10)}T12:00:00Z",
+        "repayment_date": f"{repayment}T00:00:00Z",
+        "contact_phones": [f"+99890{rnd.randint(1000000, 9999999)}"],
+    }
+
+def install_fake_billz(debt_count):
+    """api_handler ni tarmoqsiz ishlatish: /debt sahifalari so'rov vaqtida yaratiladi"""
+    import httpx
+    import api_handler
+
+    def handler(request):
+        if request.url.path.endswith("/auth/login"):
+            return httpx.Response(200, json={"data": {"access_token": "benchmark", "expires_in": 3600}})
+        page = int(request.url.params["page"])
+        limit = int(request.url.params["limit"])
+        start = (page - 1) * limit
+        data = [make_debt(i) for i in range(start, min(start + limit, debt_count))]
+        return httpx.Response(200, json={"data": data})
+
+    real_client = httpx.AsyncClient
+    api_handler.httpx.AsyncClient = lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs)
+    return api_handler
+
+def peak_rss_mb():
+    # Linuxda ru_maxrss kilobaytlarda
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# --- XOTIRA: butun ro'yxat vs oqimli qayta ishlash ---
+def memory_run(count, mode):
+    """Bitta o'lchov (alohida jarayonda ishga tushiriladi, chunki ru_maxrss faqat o'sadi)"""
+    api_handler = install_fake_billz(count)
+    os.chdir(tempfile.mkdtemp())
+    baseline = peak_rss_mb()
+
+    async def run_list():
+        # Avvalgi usul: barcha xom sahifalar -> bitta ro'yxat -> qayta ishlash -> saqlash
+        all_debts_data = await api_handler.fetch_all_debts()
+        processed_data = api_handler.process_debt_data(all_debts_data)
+        api_handler.save_json(processed_data, api_handler.DATA_FILE)
+
+    async def run_stream():
+        await api_handler.update_data_from_billz(full=True)
+
+    asyncio.run(run_list() if mode == "list" else run_stream())
+    print(f"{peak_rss_mb():.1f} {baseline:.1f}")
+
+def benchmark_memory(counts):
+    print(f"{'qarzlar':>10} | {'royxat, MB':>12} | {'oqim, MB':>10}")
+    for count in counts:
+        row = []
+        for mode in ("list", "stream"):
+            output = subprocess.run(
+                [sys.executable, __file__, "_memory_run", str(count), mode],
+                capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            ).stdout.split()
+            peak, baseline = float(output[0]), float(output[1])
+            row.append(peak - baseline)
+        print(f"{count:>10} | {row[0]:>12.1f} | {row[1]:>10.1f}")
+
+# --- EXCEL: to_excel + har bir hujayra bo'yicha kenglik vs write-only yozish ---
+def render_excel_legacy(report_data):
+    """Avvalgi usul: pandas.to_excel, so'ng har bir hujayrani aylanib ustun kengligini topish"""
+    import pandas as pd
+    from reports import EXCEL_COLUMNS, report_frame
+
+    df = report_frame(report_data)[EXCEL_COLUMNS]
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='Hisobot', index=False)
+        worksheet = writer.sheets['Hisobot']
+        for column in worksheet.columns:
+            max_length = max(len(str(cell.value)) for cell in column)
+            worksheet.column_dimensions[column[0].column_letter].width = (max_length + 2) if max_length < 50 else 50
+    return buffer.getvalue()
+
+def benchmark_excel(row_counts):
+    import api_handler
+    from reports import render_excel
+
+    print(f"{'qatorlar':>10} | {'eski, qator/s':>14} | {'yangi, qator/s':>15} | {'tezlanish':>9}")
+    for count in row_counts:
+        processed = api_handler.process_debt_data([make_debt(i) for i in range(count * 2)])
+        report_data = [debt for debts in processed.values() for debt in debts][:count]
+        while len(report_data) < count:
+            report_data += report_data[:count - len(report_data)]
+
+        rates = []
+        for render in (render_excel_legacy, render_excel):
+            started = time.perf_counter()
+            render(report_data)
+            rates.append(count / (time.perf_counter() - started))
+        print(f"{count:>10} | {rates[0]:>14,.0f} | {rates[1]:>15,.0f} | {rates[1] / rates[0]:>8.1f}x")
+
+# --- TRANSFORM: qarzdorliklarni birma-bir vs ustunlar bo'yicha qayta ishlash ---
+def benchmark_transform(row_counts):
+    import api_handler
+
+    today = datetime.now(api_handler.TZ_UZB).date()
+    print(f"{'qatorlar':>10} | {'sikl, qator/s':>14} | {'ustunli, qator/s':>17} | {'tezlanish':>9}")
+    for count in row_counts:
+        debts = [make_debt(i) for i in range(count)]
+        rates, results = [], []
+        for transform in (api_handler.add_processed_debts_loop, api_handler.add_processed_debts_columnar):
+            processed = {}
+            started = time.perf_counter()
+            transform(processed, debts, today)
+            rates.append(count / (time.perf_counter() - started))
+            results.append(processed)
+        same = "" if results[0] == results[1] else "  (natijalar farq qiladi!)"
+        print(f"{count:>10} | {rates[0]:>14,.0f} | {rates[1]:>17,.0f} | {rates[1] / rates[0]:>8.1f}x{same}")
+
+    # Noto'g'ri qiymatlarda ikkala yo'l ham bir xil xatolik berishi kerak (jimgina NaN emas)
+    for key, value in (('paid_amount', None), ('amount', "100"), ('contact_phones', [None]), ('contact_phones', ["+998", 1])):
+        debts = [make_debt(i) for i in range(100)]
+        debts[-1].update({'status': 'unpaid', key: value})
+        outcomes = []
+        for transform in (api_handler.add_processed_debts_loop, api_handler.add_processed_debts_columnar):
+            processed = {}
+            try:
+                transform(processed, debts, today)
+                outcomes.append(processed)
+            except Exception as e:
+                outcomes.append(type(e).__name__)
+        same = "bir xil" if outcomes[0] == outcomes[1] else "farq qiladi!"
+        print(f"{key}={value!r}: {outcomes[0] if isinstance(outcomes[0], str) else 'natija'} - {same}")
+
+# --- SYNC: bir vaqtda faqat bitta yangilash (single-flight) tekshiruvi ---
+def check_sync_coordinator():
+    """
+    Navbatdagi yangilash boshlanishidan oldin (joriysi endi tugagan paytda) kelgan so'rov
+    ikkinchi parallel yangilashni boshlamasligi kerak. Sun'iy yangilashlar bilan tekshiriladi.
+    """
+    from sync import SyncCoordinator
+
+    async def run():
+        coordinator = SyncCoordinator()
+        state = {'active': 0, 'peak': 0, 'calls': []}
+
+        async def job(full, remind):
+            state['active'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+            state['calls'].append((full, remind))
+            await asyncio.sleep(0.05)
+            state['active'] -= 1
+            return True
+
+        async def late_request():
+            # Vazifaning o'zini kutgan korutina joriy yangilash tugashi bilan,
+            # navbatdagisi (asyncio.wait orqali kutayotgan) boshlanishidan oldin uyg'onadi
+            await current
+            return await coordinator.run("late", job, full=True)
+
+        first = asyncio.create_task(coordinator.run("startup", job))
+        await asyncio.sleep(0)
+        current = coordinator.task
+        queued = asyncio.create_task(coordinator.run("scheduled", job, remind=True))
+        await asyncio.sleep(0)
+        late = asyncio.create_task(late_request())
+        await asyncio.gather(first, queued, late)
+        return state, coordinator.runs
+
+    state, runs = asyncio.run(run())
+    ok = state['peak'] == 1 and runs == 2 and state['calls'][-1] == (True, True)
+    print(f"yangilashlar: {runs}, bir vaqtdagi eng ko'p: {state['peak']}, chaqiruvlar: {state['calls']} - "
+          f"{'OK' if ok else 'XATO'}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Qarz bot o'lchovlari")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    memory_parser = subparsers.add_parser("memory", help="Sinxronlash vaqtidagi eng yuqori RSS")
+    memory_parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+
+    excel_parser = subparsers.add_parser("excel", help="Excel hisobot yaratish tezligi (qator/sekund)")
+    excel_parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+
+    transform_parser = subparsers.add_parser("transform", help="Qarzdorliklarni qayta ishlash tezligi (qator/sekund)")
+    transform_parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+
+    subparsers.add_parser("sync", help="Sinxronlash koordinatori: parallel yangilash bo'lmasligini tekshirish")
+
+    run_parser = subparsers.add_parser("_memory_run")
+    run_parser.add_argument("count", type=int)
+    run_parser.add_argument("mode", choices=["list", "stream"])
+
+    args = parser.parse_args()
+    if args.command == "memory":
+        benchmark_memory(args.counts)
+    elif args.command == "excel":
+        benchmark_excel(args.rows)
+    elif args.command == "transform":
+        benchmark_transform(args.rows)
+    elif args.command == "sync":
+        sys.exit(0 if check_sync_coordinator() else 1)
+    elif args.command == "_memory_run":
+        memory_run(args.count, args.mode)
+
+if __name__ == "__main__":
+    main()
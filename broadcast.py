@@ -0,0 +1,180 @@
+# broadcast.py - Ko'p foydalanuvchiga xabar yuborish: cheklangan parallellik, token bucket va qayta urinishlar
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+# Telegram chegaralari: bot uchun ~30 xabar/sekund, bitta chatga ~1 xabar/sekund
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))  # Bitta chatga qisqa portlash
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+
+# Tezlik cheklanadigan bot metodlari (birinchi argument - chat_id)
+LIMITED_METHODS = ("send_message", "send_document", "send_photo")
+
+last_broadcast_stats: Dict[str, Any] = {}
+
+class TokenBucket:
+    """Token bucket: sekundiga `rate` ta token, ko'pi bilan `capacity` ta to'planadi"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Bitta token olish (yetarli bo'lmasa kutish, kutganlar navbat bilan o'tadi)"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class RateLimitedBot:
+    """Bot o'rami: yuborish metodlari Broadcaster orqali o'tadi, qolganlari o'zgarishsiz"""
+
+    def __init__(self, bot, broadcaster: "Broadcaster"):
+        self._bot = bot
+        self._broadcaster = broadcaster
+
+    def __getattr__(self, name):
+        attribute = getattr(self._bot, name)
+        if name not in LIMITED_METHODS:
+            return attribute
+
+        async def limited(chat_id, *args, **kwargs):
+            return await self._broadcaster.call(chat_id, attribute, chat_id, *args, **kwargs)
+        return limited
+
+class BroadcastContext:
+    """send_report kabi funksiyalar uchun context o'rnini bosuvchi (faqat .bot kerak)"""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+class Broadcaster:
+    """
+    Vazifalarni cheklangan parallellikda bajarish.
+    Har bir Telegram chaqiruvi umumiy va chat bo'yicha token bucketdan o'tadi,
+    RetryAfter va tarmoq xatolarida avtomatik qayta uriniladi.
+    """
+
+    def __init__(self, bot, concurrency: int = BROADCAST_CONCURRENCY,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE, chat_rate: float = TELEGRAM_CHAT_RATE):
+        self.concurrency = concurrency
+        self.chat_rate = chat_rate
+        # Umumiy chegara uchun portlashsiz - xabarlar bir tekis taqsimlanadi
+        self.global_bucket = TokenBucket(global_rate, capacity=1)
+        self.chat_buckets: Dict[Any, TokenBucket] = {}
+        self.context = BroadcastContext(RateLimitedBot(bot, self))
+        self._paused_until = 0.0
+
+        self.calls = 0
+        self.retries = 0
+        self.call_latencies: List[float] = []
+
+    async def _wait_pause(self):
+        # RetryAfter butun bot uchun amal qiladi - hamma ishchilar kutadi
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def call(self, chat_id, func: Callable[..., Awaitable], *args, **kwargs):
+        """Bitta Telegram chaqiruvi: tezlik cheklovi + qayta urinishlar"""
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, TELEGRAM_CHAT_BURST)
+
+        attempt = 0
+        while True:
+            await self._wait_pause()
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            started = time.monotonic()
+            try:
+                result = await func(*args, **kwargs)
+                self.calls += 1
+                self.call_latencies.append(time.monotonic() - started)
+                return result
+            except RetryAfter as e:
+                if attempt >= BROADCAST_MAX_RETRIES:
+                    raise
+                logger.warning(f"Telegram cheklovi: {e.retry_after} s kutiladi")
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            except (BadRequest, Forbidden):
+                # Qayta urinish foyda bermaydi (bot bloklangan, chat topilmadi ...)
+                raise
+            except NetworkError as e:
+                if attempt >= BROADCAST_MAX_RETRIES:
+                    raise
+                delay = 2 ** attempt + random.uniform(0, 1)
+                logger.warning(f"Tarmoq xatosi ({e}), {delay:.1f} s dan keyin qayta uriniladi")
+                await asyncio.sleep(delay)
+            attempt += 1
+            self.retries += 1
+
+    async def run(self, jobs: List[Tuple[str, Callable[[BroadcastContext], Awaitable]]]) -> Dict[str, Any]:
+        """
+        Vazifalarni bajarish. Har bir vazifa (nom, fn) - fn(context) korutina qaytaradi,
+        context.bot tezligi cheklangan bot. Bitta vazifa ichidagi xabarlar tartibi saqlanadi.
+
+        Returns:
+            Yuborish statistikasi
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        job_latencies: List[float] = []
+        failed: List[str] = []
+        started = time.monotonic()
+
+        async def run_job(name, job):
+            async with semaphore:
+                job_started = time.monotonic()
+                try:
+                    await job(self.context)
+                except Exception as e:
+                    failed.append(name)
+                    logger.error(f"'{name}' yuborishda xatolik: {e}")
+                finally:
+                    job_latencies.append(time.monotonic() - job_started)
+
+        await asyncio.gather(*(run_job(name, job) for name, job in jobs))
+
+        seconds = time.monotonic() - started
+        stats = {
+            'jobs': len(jobs),
+            'failed': len(failed),
+            'messages': self.calls,
+            'retries': self.retries,
+            'seconds': round(seconds, 2),
+            'messages_per_second': round(self.calls / seconds, 2) if seconds > 0 else 0.0,
+            'call_latency_p50': round(percentile(self.call_latencies, 0.5), 3),
+            'call_latency_p95': round(percentile(self.call_latencies, 0.95), 3),
+            'job_latency_max': round(max(job_latencies, default=0.0), 3),
+        }
+        last_broadcast_stats.clear()
+        last_broadcast_stats.update(stats)
+        logger.info(
+            f"Yuborish yakunlandi: {stats['jobs']} ta vazifa ({stats['failed']} ta xato), "
+            f"{stats['messages']} ta xabar, {stats['seconds']} s, {stats['messages_per_second']} xabar/s, "
+            f"qayta urinishlar: {stats['retries']}, p95: {stats['call_latency_p95']} s"
+        )
+        return stats
+
+def get_last_broadcast_stats() -> Dict[str, Any]:
+    """Oxirgi yuborish statistikasi"""
+    return dict(last_broadcast_stats)
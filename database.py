@@ -0,0 +1,327 @@
+# database.py - Ixtiyoriy SQLite ombori (STORAGE_BACKEND=sqlite bo'lganda ishlatiladi)
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+DATABASE_FILE = os.getenv("DATABASE_FILE", "qarz_bot.db")
+TZ_UZB = pytz.timezone('Asia/Tashkent')
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS debts (
+    id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    seller_name TEXT NOT NULL,
+    customer_name TEXT NOT NULL,
+    customer_phone TEXT NOT NULL,
+    status TEXT,
+    repayment_date TEXT,
+    amount NUMERIC NOT NULL DEFAULT 0,
+    paid_amount NUMERIC NOT NULL DEFAULT 0,
+    remaining_amount NUMERIC NOT NULL DEFAULT 0,
+    sync_version INTEGER NOT NULL,
+    row TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_debts_seller ON debts (seller_name, seq);
+CREATE INDEX IF NOT EXISTS idx_debts_customer ON debts (customer_name, customer_phone);
+CREATE INDEX IF NOT EXISTS idx_debts_status ON debts (status);
+CREATE INDEX IF NOT EXISTS idx_debts_repayment ON debts (repayment_date);
+CREATE INDEX IF NOT EXISTS idx_debts_seller_repayment ON debts (seller_name, repayment_date);
+
+CREATE TABLE IF NOT EXISTS seller_users (
+    seller_name TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (seller_name, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_seller_users_user ON seller_users (user_id);
+
+CREATE TABLE IF NOT EXISTS pending_actions (
+    admin_id INTEGER PRIMARY KEY,
+    seller_name TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_connection: Optional[sqlite3.Connection] = None
+_lock = threading.RLock()
+
+def get_connection() -> sqlite3.Connection:
+    """Umumiy ulanish (birinchi murojaatda jadvallar yaratiladi)"""
+    global _connection
+    with _lock:
+        if _connection is None:
+            connection = sqlite3.connect(DATABASE_FILE, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            _connection = connection
+        return _connection
+
+def today_str() -> str:
+    return datetime.now(TZ_UZB).date().strftime('%Y-%m-%d')
+
+def _rows(query: str, params=()) -> List[Dict[str, Any]]:
+    with _lock:
+        return [json.loads(row) for (row,) in get_connection().execute(query, params)]
+
+# --- QARZDORLIKLAR ---
+def replace_debts(processed_data: Dict[str, List[Dict[str, Any]]]) -> int:
+    """
+    Sinxronlash natijasini bitta tranzaksiyada yozish: barcha qatorlar upsert qilinadi,
+    yangi to'plamda yo'q qatorlar o'chiriladi.
+
+    Returns:
+        Yangi sinxronlash versiyasi
+    """
+    with _lock:
+        connection = get_connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            (version,) = connection.execute("SELECT COALESCE(MAX(sync_version), 0) + 1 FROM debts").fetchone()
+            rows = []
+            seq = 0
+            for seller_name, debts in processed_data.items():
+                for debt in debts:
+                    repayment_date = debt.get('To\'lov Muddati')
+                    rows.append((
+                        debt.get('ID') or f"{seller_name}:{debt.get('Chek Raqami', '')}:{seq}",
+                        seq,
+                        seller_name,
+                        debt.get('Mijoz Ismi', ''),
+                        debt.get('Mijoz Telefoni', ''),
+                        debt.get('Qarz Statusi'),
+                        repayment_date if isinstance(repayment_date, str) and DATE_PATTERN.match(repayment_date) else None,
+                        debt.get('Qarz Summasi', 0),
+                        debt.get('To\'langan Summa', 0),
+                        debt.get('Qolgan Summa', 0),
+                        version,
+                        json.dumps(debt, ensure_ascii=False, separators=(',', ':')),
+                    ))
+                    seq += 1
+            connection.executemany(
+                """
+                INSERT INTO debts (id, seq, seller_name, customer_name, customer_phone, status, repayment_date,
+                                   amount, paid_amount, remaining_amount, sync_version, row)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    seq = excluded.seq, seller_name = excluded.seller_name,
+                    customer_name = excluded.customer_name, customer_phone = excluded.customer_phone,
+                    status = excluded.status, repayment_date = excluded.repayment_date,
+                    amount = excluded.amount, paid_amount = excluded.paid_amount,
+                    remaining_amount = excluded.remaining_amount,
+                    sync_version = excluded.sync_version, row = excluded.row
+                """,
+                rows,
+            )
+            connection.execute("DELETE FROM debts WHERE sync_version != ?", (version,))
+            connection.execute(
+                "INSERT INTO meta (key, value) VALUES ('last_sync', ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (str(time.time()),),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+    logger.info(f"SQLite: {len(rows)} ta qarzdorlik yozildi (versiya {version})")
+    return version
+
+def has_debts() -> bool:
+    with _lock:
+        return get_connection().execute("SELECT EXISTS (SELECT 1 FROM debts)").fetchone()[0] == 1
+
+def get_last_sync_time() -> Optional[float]:
+    with _lock:
+        row = get_connection().execute("SELECT value FROM meta WHERE key = 'last_sync'").fetchone()
+    return float(row[0]) if row else None
+
+def get_seller_names() -> List[str]:
+    with _lock:
+        return [name for (name,) in get_connection().execute("SELECT DISTINCT seller_name FROM debts ORDER BY seller_name")]
+
+def get_all_debts() -> List[Dict[str, Any]]:
+    return _rows("SELECT row FROM debts ORDER BY seq")
+
+def get_seller_debts(seller_name: str) -> List[Dict[str, Any]]:
+    return _rows("SELECT row FROM debts WHERE seller_name = ? ORDER BY seq", (seller_name,))
+
+def get_debts_by_status(status: str) -> List[Dict[str, Any]]:
+    return _rows("SELECT row FROM debts WHERE status = ? ORDER BY seq", (status,))
+
+# Muddat guruhlari uchun shartlar (sana bugungi kunga nisbatan so'rov vaqtida hisoblanadi)
+BUCKET_CONDITIONS = {
+    "overdue": "repayment_date < :today",
+    "today": "repayment_date = :today",
+    "upcoming": "repayment_date > :today",
+    "unknown": "repayment_date IS NULL",
+}
+
+def _seller_condition(condition: str, seller_name: Optional[str]) -> str:
+    return condition if seller_name is None else f"seller_name = :seller_name AND {condition}"
+
+def get_due_bucket(bucket: str, seller_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Muddat guruhidagi qarzdorliklar, muddati bo'yicha saralangan (ixtiyoriy - faqat bitta sotuvchi)"""
+    condition = _seller_condition(BUCKET_CONDITIONS[bucket], seller_name)
+    params = {'today': today_str(), 'seller_name': seller_name}
+    return _rows(f"SELECT row FROM debts WHERE {condition} ORDER BY repayment_date, seq", params)
+
+def count_due_bucket(bucket: str, seller_name: Optional[str] = None) -> int:
+    """Muddat guruhidagi qarzdorliklar soni"""
+    condition = _seller_condition(BUCKET_CONDITIONS[bucket], seller_name)
+    with _lock:
+        return get_connection().execute(
+            f"SELECT COUNT(*) FROM debts WHERE {condition}", {'today': today_str(), 'seller_name': seller_name}
+        ).fetchone()[0]
+
+def get_due_within(days: int, seller_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Muddati bugundan boshlab `days` kun ichida bo'lgan qarzdorliklar (repayment_date indeksi bo'yicha oraliq)"""
+    today = datetime.now(TZ_UZB).date()
+    condition = _seller_condition("repayment_date BETWEEN :start AND :end", seller_name)
+    params = {
+        'start': today.strftime('%Y-%m-%d'),
+        'end': (today + timedelta(days=days)).strftime('%Y-%m-%d'),
+        'seller_name': seller_name,
+    }
+    return _rows(f"SELECT row FROM debts WHERE {condition} ORDER BY repayment_date, seq", params)
+
+def get_customer_summary(customer_name: str, customer_phone: str) -> Optional[Dict[str, Any]]:
+    """Mijozning qarzdorliklari va yig'indilari - indeks bo'yicha bitta so'rov"""
+    with _lock:
+        connection = get_connection()
+        totals = connection.execute(
+            """
+            SELECT COUNT(*), COALESCE(SUM(amount), 0), COALESCE(SUM(paid_amount), 0),
+                   COALESCE(SUM(remaining_amount), 0), COALESCE(SUM(repayment_date < ?), 0), MIN(repayment_date)
+            FROM debts WHERE customer_name = ? AND customer_phone = ?
+            """,
+            (today_str(), customer_name, customer_phone),
+        ).fetchone()
+    if not totals[0]:
+        return None
+    return {
+        'debts': _rows("SELECT row FROM debts WHERE customer_name = ? AND customer_phone = ? ORDER BY seq", (customer_name, customer_phone)),
+        'total_original': totals[1],
+        'total_paid': totals[2],
+        'remaining': totals[3],
+        'overdue_count': totals[4],
+        'earliest_due': totals[5],
+    }
+
+# --- SOTUVCHILAR VA FOYDALANUVCHILAR ---
+def load_sellers() -> Dict[str, Any]:
+    """sellers.json bilan bir xil ko'rinishda: {sotuvchi: [user_id, ...]}"""
+    sellers: Dict[str, List[int]] = {}
+    with _lock:
+        for seller_name, user_id in get_connection().execute(
+            "SELECT seller_name, user_id FROM seller_users ORDER BY rowid, position"
+        ):
+            sellers.setdefault(seller_name, []).append(user_id)
+    return sellers
+
+def save_sellers(sellers: Dict[str, Any]):
+    """Sotuvchilar ro'yxatini to'liq almashtirish (bitta tranzaksiya)"""
+    rows = []
+    for seller_name, user_ids in sellers.items():
+        if isinstance(user_ids, int):
+            user_ids = [user_ids]
+        for position, user_id in enumerate(user_ids or []):
+            rows.append((seller_name, user_id, position))
+    with _lock:
+        connection = get_connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM seller_users")
+            connection.executemany("INSERT OR IGNORE INTO seller_users (seller_name, user_id, position) VALUES (?, ?, ?)", rows)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+def get_seller_name_by_user_id(user_id: int) -> Optional[str]:
+    with _lock:
+        row = get_connection().execute(
+            "SELECT seller_name FROM seller_users WHERE user_id = ? ORDER BY rowid LIMIT 1", (user_id,)
+        ).fetchone()
+    return row[0] if row else None
+
+def get_seller_user_ids(seller_name: str) -> List[int]:
+    with _lock:
+        return [user_id for (user_id,) in get_connection().execute(
+            "SELECT user_id FROM seller_users WHERE seller_name = ? ORDER BY position", (seller_name,)
+        )]
+
+# --- ADMIN KUTAYOTGAN AMALLAR ---
+def get_pending_action(admin_id: int) -> Optional[str]:
+    with _lock:
+        row = get_connection().execute("SELECT seller_name FROM pending_actions WHERE admin_id = ?", (admin_id,)).fetchone()
+    return row[0] if row else None
+
+def set_pending_action(admin_id: int, seller_name: str):
+    with _lock:
+        get_connection().execute(
+            "INSERT INTO pending_actions (admin_id, seller_name, created_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(admin_id) DO UPDATE SET seller_name = excluded.seller_name, created_at = excluded.created_at",
+            (admin_id, seller_name, time.time()),
+        )
+
+def clear_pending_action(admin_id: int):
+    with _lock:
+        get_connection().execute("DELETE FROM pending_actions WHERE admin_id = ?", (admin_id,))
+
+def load_pending_actions() -> Dict[int, Tuple[str, float]]:
+    """Barcha kutish holatlari: {admin_id: (sotuvchi nomi, yaratilgan vaqt)}"""
+    with _lock:
+        return {
+            admin_id: (seller_name, created_at)
+            for admin_id, seller_name, created_at in get_connection().execute(
+                "SELECT admin_id, seller_name, created_at FROM pending_actions"
+            )
+        }
+
+def save_pending_actions(actions: Dict[int, Tuple[str, float]]):
+    """Kutish holatlarini to'liq almashtirish (bitta tranzaksiya)"""
+    with _lock:
+        connection = get_connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM pending_actions")
+            connection.executemany(
+                "INSERT INTO pending_actions (admin_id, seller_name, created_at) VALUES (?, ?, ?)",
+                [(admin_id, seller_name, created_at) for admin_id, (seller_name, created_at) in actions.items()],
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+def import_json_state(sellers_file: str, waiting_file: str, load_json):
+    """Birinchi ishga tushirishda mavjud JSON fayllardan ma'lumotlarni ko'chirish"""
+    with _lock:
+        connection = get_connection()
+        if connection.execute("SELECT EXISTS (SELECT 1 FROM seller_users)").fetchone()[0] == 0:
+            sellers = load_json(sellers_file)
+            if sellers:
+                save_sellers(sellers)
+                logger.info(f"SQLite: {sellers_file} dan {len(sellers)} ta sotuvchi ko'chirildi")
+        if connection.execute("SELECT EXISTS (SELECT 1 FROM pending_actions)").fetchone()[0] == 0:
+            for admin_id, value in load_json(waiting_file).items():
+                # Eski format - faqat sotuvchi nomi, yangisi - {"seller_name": ..., "created_at": ...}
+                seller_name = value.get('seller_name') if isinstance(value, dict) else value
+                if seller_name:
+                    set_pending_action(int(admin_id), seller_name)
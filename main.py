@@ -1,26 +1,39 @@
 # main.py - Maxfiy bot - faqat admin ruxsati bilan kirish
 
+import asyncio
 import logging
 import os
-import json
 from datetime import datetime
 import pytz
-import pandas as pd
 from telegram import Update, KeyboardButton, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from dotenv import load_dotenv
-from api_handler import update_data_from_billz
+from api_handler import update_data_from_billz, get_last_sync_stats, close_http_client
+from broadcast import Broadcaster, get_last_broadcast_stats
+from sync import sync_coordinator
+from reports import render_excel, render_in_pool, cached_render, get_render_stats
+from state import create_state_store
+from storage import save_json, load_json, STORAGE_BACKEND
+import database
+from store import (
+    get_snapshot, get_sync_time, get_data_age, format_age,
+    BUCKET_OVERDUE, UPCOMING_DAYS, UPCOMING_BUTTON, today_ordinal, deadline_text
+)
 from search import (
-    search_customers_by_name,
-    get_customer_debts,
+    get_customer_summary,
     create_search_results_keyboard,
     format_search_results_message,
     format_customer_details,
     is_search_query,
     get_paginated_results,
-    user_all_search_results,
-    user_current_page
+    start_search_session,
+    get_search_session,
+    get_session_customer,
+    clear_search_session,
+    expire_search_sessions,
+    get_search_session_stats,
+    RESULTS_PER_PAGE
 )
 
 # --- ⚙️ ASOSIY SOZLAMALAR (.env faylidan o'qiladi) ⚙️ ---
@@ -36,6 +49,7 @@ if not ADMIN_CHAT_IDS_STR:
 # Admin ID larni ajratish va tekshirish
 try:
     ADMIN_CHAT_IDS = [int(admin_id.strip()) for admin_id in ADMIN_CHAT_IDS_STR.split(",")]
+    ADMIN_CHAT_ID_SET = frozenset(ADMIN_CHAT_IDS)
 except ValueError:
     raise ValueError("XATOLIK: .env faylidagi ADMIN_CHAT_ID da barcha qiymatlar raqam bo'lishi kerak.")
 
@@ -48,9 +62,23 @@ ADMIN_CHAT_ID = ADMIN_CHAT_IDS[0]
 DATA_FILE = "data.json"
 SELLERS_FILE = "sellers.json"
 WAITING_FOR_USER_ID_FILE = "waiting_for_user_id.json"  # Yangi fayl - admin user ID kutayotganda
+
+# Admin kutish holatlari xotirada (fayl yoki SQLite ga kechiktirib saqlanadi)
+conversation_state = create_state_store(WAITING_FOR_USER_ID_FILE, STORAGE_BACKEND)
 TZ_UZB = pytz.timezone('Asia/Tashkent')
 REPORT_LIMIT = 8 # Hisobotni matn yoki Excelda yuborish chegarasi
 
+# Ishga tushgandagi birinchi sinxronlash fonda bajariladi - bot shu vaqtda saqlangan nusxa bilan ishlaydi
+startup_sync_task = None
+SYNC_PROGRESS_INTERVAL = 3  # Admin ko'radigan yangilash holati shuncha sekundda yangilanadi
+SYNC_STAGES = {
+    'token': "token olinmoqda",
+    'fetch': "yuklanmoqda",
+    'save': "saqlanmoqda",
+    'done': "yakunlandi",
+    'failed': "xatolik",
+}
+
 # LOGGING SOZLASH - USER ID'LARNI YASHIRISH UCHUN
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -76,45 +104,79 @@ def safe_user_ids_list(user_ids):
 # --- YORDAMCHI FUNKSIYALAR ---
 def is_admin(user_id):
     """Foydalanuvchi admin ekanligini tekshirish"""
-    return user_id in ADMIN_CHAT_IDS
+    return user_id in ADMIN_CHAT_ID_SET
+
+def load_sellers():
+    """Sotuvchilar ro'yxatini yuklash (sellers.json yoki SQLite)"""
+    if STORAGE_BACKEND == "sqlite":
+        return database.load_sellers()
+    return load_json(SELLERS_FILE)
+
+def save_sellers(sellers):
+    """Sotuvchilar ro'yxatini saqlash (sellers.json yoki SQLite)"""
+    if STORAGE_BACKEND == "sqlite":
+        database.save_sellers(sellers)
+    else:
+        save_json(sellers, SELLERS_FILE)
+    invalidate_seller_index()
+
+# --- FOYDALANUVCHI ROLLARI INDEKSI ---
+# Har bir xabarda faylni o'qib, ro'yxatni aylanmaslik uchun: user_id -> sotuvchi nomi.
+# Sotuvchilar ro'yxati o'zgarganda (save_sellers) tozalanadi va keyingi murojaatda qayta quriladi.
+ROLE_ADMIN = "admin"
+ROLE_SELLER = "seller"
+
+_seller_index = None
+
+def build_seller_index(sellers):
+    """(user_id -> sotuvchi nomi, sotuvchi nomi -> user ID lar)"""
+    user_to_seller, seller_users = {}, {}
+    for seller_name, user_ids in sellers.items():
+        if isinstance(user_ids, int):
+            user_ids = [user_ids]
+        elif not isinstance(user_ids, list):
+            user_ids = []
+        seller_users[seller_name] = list(user_ids)
+        for user_id in user_ids:
+            # Bir foydalanuvchi bir nechta sotuvchida bo'lsa - birinchisi (avvalgi qidiruv bilan bir xil)
+            user_to_seller.setdefault(user_id, seller_name)
+    return user_to_seller, seller_users
+
+def get_seller_index():
+    global _seller_index
+    index = _seller_index
+    if index is None:
+        index = _seller_index = build_seller_index(load_sellers())
+    return index
+
+def invalidate_seller_index():
+    global _seller_index
+    _seller_index = None
+
+def get_user_role(user_id):
+    """Foydalanuvchi roli: (ROLE_ADMIN, None), (ROLE_SELLER, sotuvchi nomi) yoki (None, None)"""
+    if is_admin(user_id):
+        return ROLE_ADMIN, None
+    seller_name = get_seller_index()[0].get(user_id)
+    if seller_name is not None:
+        return ROLE_SELLER, seller_name
+    return None, None
 
 def is_seller(user_id):
     """Foydalanuvchi sotuvchi ekanligini tekshirish"""
-    sellers = load_json(SELLERS_FILE)
-    for seller_name, user_ids in sellers.items():
-        if isinstance(user_ids, list):
-            if user_id in user_ids:
-                return True
-        elif isinstance(user_ids, int):
-            if user_id == user_ids:
-                return True
-    return False
+    return user_id in get_seller_index()[0]
 
 def get_seller_name_by_user_id(user_id):
     """User ID bo'yicha sotuvchi nomini topish"""
-    sellers = load_json(SELLERS_FILE)
-    for seller_name, user_ids in sellers.items():
-        if isinstance(user_ids, list):
-            if user_id in user_ids:
-                return seller_name
-        elif isinstance(user_ids, int):
-            if user_id == user_ids:
-                return seller_name
-    return None
+    return get_seller_index()[0].get(user_id)
 
 def get_seller_user_ids(seller_name):
     """Sotuvchi nomiga tegishli barcha user ID larni olish"""
-    sellers = load_json(SELLERS_FILE)
-    user_ids = sellers.get(seller_name, [])
-    if isinstance(user_ids, int):
-        return [user_ids]
-    elif isinstance(user_ids, list):
-        return user_ids
-    return []
+    return list(get_seller_index()[1].get(seller_name, []))
 
 def add_user_to_seller(seller_name, user_id):
     """Sotuvchiga yangi foydalanuvchi qo'shish"""
-    sellers = load_json(SELLERS_FILE)
+    sellers = load_sellers()
 
     if seller_name not in sellers:
         sellers[seller_name] = [user_id]
@@ -132,12 +194,12 @@ def add_user_to_seller(seller_name, user_id):
         else:
             sellers[seller_name] = [user_id]
 
-    save_json(sellers, SELLERS_FILE)
+    save_sellers(sellers)
     return True
 
 def remove_user_from_all_sellers(user_id):
     """Foydalanuvchini barcha sotuvchilardan o'chirish (profil o'zgartirish uchun)"""
-    sellers = load_json(SELLERS_FILE)
+    sellers = load_sellers()
     old_seller_name = None
 
     for seller_name, user_ids in sellers.items():
@@ -155,31 +217,24 @@ def remove_user_from_all_sellers(user_id):
                 del sellers[seller_name]
                 break
 
-    save_json(sellers, SELLERS_FILE)
+    save_sellers(sellers)
     return old_seller_name
 
 def is_waiting_for_user_id(admin_id):
     """Admin user ID kutayotganini tekshirish"""
-    waiting = load_json(WAITING_FOR_USER_ID_FILE)
-    return str(admin_id) in waiting
+    return conversation_state.get(admin_id) is not None
 
 def set_waiting_for_user_id(admin_id, seller_name):
     """Admin user ID kutish holatiga qo'yish"""
-    waiting = load_json(WAITING_FOR_USER_ID_FILE)
-    waiting[str(admin_id)] = seller_name
-    save_json(waiting, WAITING_FOR_USER_ID_FILE)
+    conversation_state.set(admin_id, seller_name)
 
 def get_waiting_seller_name(admin_id):
     """Admin qaysi sotuvchi uchun user ID kutayotganini olish"""
-    waiting = load_json(WAITING_FOR_USER_ID_FILE)
-    return waiting.get(str(admin_id))
+    return conversation_state.get(admin_id)
 
 def clear_waiting_for_user_id(admin_id):
     """Admin user ID kutish holatini tozalash"""
-    waiting = load_json(WAITING_FOR_USER_ID_FILE)
-    if str(admin_id) in waiting:
-        del waiting[str(admin_id)]
-        save_json(waiting, WAITING_FOR_USER_ID_FILE)
+    conversation_state.clear(admin_id)
 
 async def send_message_to_all_admins(context: ContextTypes.DEFAULT_TYPE, message: str, parse_mode=None):
     """Barcha adminlarga xabar yuborish"""
@@ -202,41 +257,24 @@ async def send_message_to_seller_users(context: ContextTypes.DEFAULT_TYPE, selle
 
     logger.info(f"Sotuvchi '{seller_name}' ga {success_count}/{len(user_ids)} ta foydalanuvchiga xabar yuborildi")
 
-# --- JSON FAYL BILAN ISHLASH FUNKSIYALARI ---
-def load_json(filename):
-    if not os.path.exists(filename):
-        return {}
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return {} # Agar fayl bo'sh yoki buzilgan bo'lsa
-
-def save_json(data, filename):
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
-
 # --- YORDAMCHI FUNKSIYALAR ---
-async def send_report(update_or_query, context: ContextTypes.DEFAULT_TYPE, report_data: list, title: str, filename_prefix: str):
-    """Hisobotni matn yoki Excel fayli sifatida yuboradi"""
+def build_report(report_data: list, title: str, filename_prefix: str) -> dict:
+    """
+    Hisobotni bir marta tayyorlash (matn yoki Excel fayli).
+    Natijani bir nechta chatga deliver_report() bilan yuborish mumkin.
+    """
 
     def escape_markdown(text: str) -> str:
         import re
         escape_chars = r"_*[]()~`>#+-=|{}.!"
         return re.sub(f"([{re.escape(escape_chars)}])", r"\\\1", str(text))
 
-    # Update yoki CallbackQuery dan chat_id olish
-    if hasattr(update_or_query, 'effective_chat'):
-        chat_id = update_or_query.effective_chat.id
-    else:
-        # CallbackQuery bo'lsa
-        chat_id = update_or_query.message.chat.id
-
     if not report_data:
-        await context.bot.send_message(chat_id, f"✅ '{title}' bo'yicha aktiv qarzdorliklar topilmadi\\.")
-        return
+        return {'kind': 'empty', 'text': f"✅ '{title}' bo'yicha aktiv qarzdorliklar topilmadi\\."}
 
     total_amount = sum(debt.get('Qolgan Summa', 0) for debt in report_data)
+    # "Muddati" matni tayyorlash vaqtidagi sanaga nisbatan yasaladi (saqlangan matn eskirgan bo'lishi mumkin)
+    today = today_ordinal()
 
     # Agar qatorlar soni limitdan kam bo'lsa, matn sifatida yuborish
     if len(report_data) <= REPORT_LIMIT:
@@ -247,7 +285,7 @@ async def send_report(update_or_query, context: ContextTypes.DEFAULT_TYPE, repor
         )
         for debt in report_data:
             payment_date = debt.get('To\'lov Muddati', 'N/A')
-            deadline = debt.get('Muddati', 'N/A')
+            deadline = deadline_text(debt, today)
             customer_name = debt.get('Mijoz Ismi', 'N/A')
             check_number = debt.get('Chek Raqami', 'N/A')
             customer_phone = debt.get('Mijoz Telefoni', 'N/A')
@@ -259,46 +297,88 @@ async def send_report(update_or_query, context: ContextTypes.DEFAULT_TYPE, repor
                 f"💰 {escape_markdown(f'{remaining_amount:,.0f}')} so'm \\| "
                 f"🗓️ {escape_markdown(payment_date)} \\({escape_markdown(deadline)}\\)\n\n"
             )
-        await context.bot.send_message(chat_id, message, parse_mode='MarkdownV2')
+        return {'kind': 'text', 'text': message}
 
     # Aks holda, Excel fayli sifatida yuborish
-    else:
-        await context.bot.send_message(chat_id, f"📄 Hisobotdagi qatorlar soni ({len(report_data)} ta) ko'p bo'lgani uchun Excel fayl shaklida yuborilmoqda...")
+    report = {
+        'kind': 'excel',
+        'notice': f"📄 Hisobotdagi qatorlar soni ({len(report_data)} ta) ko'p bo'lgani uchun Excel fayl shaklida yuborilmoqda...",
+        # Fayl nomidagi vaqt yuborish paytida qo'yiladi - keshdagi hisobot kun davomida qayta yuborilishi mumkin
+        'filename_prefix': filename_prefix,
+        # Fayl nomi bo'yicha Telegram qaytargan file_id - o'sha nom bilan qayta yuklamaslik uchun
+        'file_ids': {},
+        'lock': asyncio.Lock(),
+    }
+
+    # Fayl xotirada yaratiladi - diskka yozilmaydi, parallel so'rovlarda nomlar to'qnashmaydi
 
-        df = pd.DataFrame(report_data)
-        excel_columns = [
-            'Chek Raqami', 'Sotuvchi Ismi', 'Mijoz Ismi', 'Mijoz Telefoni',
-            'Yaratilgan Sana', 'Qarz Summasi', 'To\'langan Summa', 'Qolgan Summa',
-            'Qarz Statusi', 'To\'lov Muddati', 'Muddati'
-        ]
-        df = df[excel_columns]
+    try:
+        report['content'] = render_excel(report_data, today)
+    except Exception as e:
+        logger.error(f"Excel faylni yaratishda xatolik: {e}")
+        report['error'] = e
 
-        filename = f"{filename_prefix}_{datetime.now(TZ_UZB).strftime('%Y%m%d_%H%M')}.xlsx"
+    return report
 
-        try:
-            with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Hisobot', index=False)
-                worksheet = writer.sheets['Hisobot']
-                # Ustunlarni avtomatik kengaytirish
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = (max_length + 2) if max_length < 50 else 50
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
-
-            with open(filename, 'rb') as doc:
-                await context.bot.send_document(chat_id, document=doc)
-            os.remove(filename)
+async def deliver_report(chat_id, context: ContextTypes.DEFAULT_TYPE, report: dict):
+    """Tayyor hisobotni bitta chatga yuborish (Excel fayli ikkinchi marta file_id orqali yuboriladi)"""
+    if report['kind'] == 'empty':
+        await context.bot.send_message(chat_id, report['text'])
+        return
+    if report['kind'] == 'text':
+        await context.bot.send_message(chat_id, report['text'], parse_mode='MarkdownV2')
+        return
 
-        except Exception as e:
-            logger.error(f"Excel faylni yaratish yoki yuborishda xatolik: {e}")
-            await context.bot.send_message(chat_id, f"❌ Excel faylni yuborishda xatolik yuz berdi: {e}")
+    await context.bot.send_message(chat_id, report['notice'])
+    try:
+        if report.get('error') is not None:
+            raise report['error']
+        filename = f"{report['filename_prefix']}_{datetime.now(TZ_UZB).strftime('%Y%m%d_%H%M')}.xlsx"
+        async with report['lock']:
+            # Bir nechta oluvchi bo'lsa - fayl shu nom bilan faqat birinchisiga yuklanadi
+            # (file_id bilan yuborilgan hujjat birinchi yuklashdagi nomni saqlaydi)
+            if filename not in report['file_ids']:
+                message = await context.bot.send_document(chat_id, document=report['content'], filename=filename)
+                report['file_ids'][filename] = message.document.file_id
+                return
+        await context.bot.send_document(chat_id, document=report['file_ids'][filename])
+
+    except Exception as e:
+        logger.error(f"Excel faylni yaratish yoki yuborishda xatolik: {e}")
+        await context.bot.send_message(chat_id, f"❌ Excel faylni yuborishda xatolik yuz berdi: {e}")
+
+def is_startup_sync_running() -> bool:
+    return startup_sync_task is not None and not startup_sync_task.done()
+
+def data_age_note() -> str:
+    """Ishga tushgandagi yangilash hali tugamagan bo'lsa - ma'lumotlar yoshi haqida ogohlantirish (oddiy matn)"""
+    if not is_startup_sync_running():
+        return ""
+    age = get_data_age(DATA_FILE)
+    if age is None:
+        return "⏳ Ma'lumotlar hali yuklanmoqda, birozdan keyin qayta urinib ko'ring."
+    return f"⏳ Ma'lumotlar yangilanmoqda. Ko'rsatilgan holat {format_age(age)} oldingi."
+
+async def send_report(update_or_query, context: ContextTypes.DEFAULT_TYPE, report_data: list, title: str, filename_prefix: str, version: int):
+    """
+    Hisobotni matn yoki Excel fayli sifatida yuboradi.
+    version - report_data olingan ma'lumotlar nusxasining versiyasi (keshda shu versiya bilan saqlanadi)
+    """
+    # Update yoki CallbackQuery dan chat_id olish
+    if hasattr(update_or_query, 'effective_chat'):
+        chat_id = update_or_query.effective_chat.id
+    else:
+        # CallbackQuery bo'lsa
+        chat_id = update_or_query.message.chat.id
+
+    # Tayyor hisobot keshdan (hisobot turi/sotuvchi, sana; yangi nusxa e'lon qilinganda kesh tozalanadi).
+    # Bo'lmasa ishchi oqimda tayyorlanadi, bir vaqtdagi bir xil so'rovlar birlashtiriladi
+    report_key = ('report', filename_prefix, title, today_ordinal())
+    report = await cached_render(report_key, version, build_report, report_data, title, filename_prefix)
+    note = data_age_note()
+    if note:
+        await context.bot.send_message(chat_id, note)
+    await deliver_report(chat_id, context, report)
 
 # --- KEYBOARD YARATISH FUNKSIYALARI ---
 def create_admin_keyboard():
@@ -313,17 +393,17 @@ def create_admin_keyboard():
 def create_seller_keyboard():
     keyboard = [
         [KeyboardButton("📊 Mening hisobotim"), KeyboardButton("⏰ Muddati o'tganlar")],
-        [KeyboardButton("📅 5 kun qolganlar"), KeyboardButton("📈 Barcha qarzdorliklar")],
+        [KeyboardButton(UPCOMING_BUTTON), KeyboardButton("📈 Barcha qarzdorliklar")],
         [KeyboardButton("🔍 Mijoz qidirish"), KeyboardButton("🔄 Profil o'zgartirish")]  # Yangi tugma qo'shildi
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 def create_seller_selection_keyboard():
-    all_debts = load_json(DATA_FILE)
-    if not all_debts:
+    snapshot = get_snapshot(DATA_FILE)
+    if not snapshot:
         return None
     keyboard = []
-    sellers = sorted(list(all_debts.keys()))
+    sellers = snapshot.sellers
     for i in range(0, len(sellers), 2):
         # Sotuvchi nomini 25 belgigacha qisqartirish
         seller1_name = sellers[i] if len(sellers[i]) <= 25 else sellers[i][:22] + "..."
@@ -337,12 +417,12 @@ def create_seller_selection_keyboard():
 
 def create_add_user_keyboard():
     """Yangi foydalanuvchi qo'shish uchun sotuvchilar ro'yxatini yaratish"""
-    all_debts = load_json(DATA_FILE)
-    if not all_debts:
+    snapshot = get_snapshot(DATA_FILE)
+    if not snapshot:
         return None
 
     keyboard = []
-    sellers = sorted(list(all_debts.keys()))
+    sellers = snapshot.sellers
 
     for i in range(0, len(sellers), 2):
         # Sotuvchi nomini 25 belgigacha qisqartirish
@@ -361,12 +441,12 @@ def create_add_user_keyboard():
 
 def create_profile_change_keyboard():
     """Profil o'zgartirish uchun sotuvchilar ro'yxatini yaratish"""
-    all_debts = load_json(DATA_FILE)
-    if not all_debts:
+    snapshot = get_snapshot(DATA_FILE)
+    if not snapshot:
         return None
 
     keyboard = []
-    sellers = sorted(list(all_debts.keys()))
+    sellers = snapshot.sellers
 
     for i in range(0, len(sellers), 2):
         # Sotuvchi nomini 25 belgigacha qisqartirish
@@ -515,22 +595,18 @@ async def handle_search_query(update: Update, context: ContextTypes.DEFAULT_TYPE
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
 
-    # Qidiruv natijalarini olish
-    search_results = search_customers_by_name(search_query, DATA_FILE, limit=50)  # Ko'proq natija olish
+    # Qidiruv natijalari sessiyada (mijozlar raqamlari, asl so'rov va sahifa bilan) saqlanadi
+    session = start_search_session(user_id, search_query, DATA_FILE)
 
-    if not search_results:
+    if session is None:
         await update.message.reply_text(f"❌ '{search_query}' bo'yicha mijozlar topilmadi.")
         return
 
-    # Global o'zgaruvchilarda saqlash
-    user_all_search_results[user_id] = search_results
-    user_current_page[user_id] = 0
-
     # Birinchi sahifani olish
-    page_results, has_more = get_paginated_results(user_id, 0, 5)
+    page_results, has_more = get_paginated_results(user_id, 0, RESULTS_PER_PAGE)
 
     # Natijalarni formatlash va yuborish
-    message = format_search_results_message(page_results, search_query, 0, len(search_results))
+    message = format_search_results_message(page_results, session.query, 0, session.matches, session.total)
     keyboard = create_search_results_keyboard(page_results, user_id, 0, has_more)
 
     if keyboard:
@@ -542,21 +618,29 @@ async def handle_customer_selection(query, context: ContextTypes.DEFAULT_TYPE, s
     """Tanlangan mijoz haqida batafsil ma'lumot ko'rsatish"""
     user_id = query.from_user.id
 
-    # Foydalanuvchining search natijalarini olish
-    search_results = user_all_search_results.get(user_id, [])
+    session = get_search_session(user_id)
+    if session is None:
+        await query.answer("❌ Qidiruv muddati tugagan, qaytadan qidiring")
+        return
+    if session.stale:
+        # Ma'lumotlar yangilangan - eski tugmadagi raqam boshqa mijozni ko'rsatishi mumkin
+        if await show_search_page(query, user_id, session, session.page):
+            await query.answer("🔄 Ma'lumotlar yangilandi, mijozni qaytadan tanlang")
+        return
 
     try:
         index = int(selection_index)
-        if 0 <= index < len(search_results):
-            customer_data = search_results[index]
+        customer_data = get_session_customer(user_id, index)
+        if customer_data is not None:
             customer_name = customer_data['customer_name']
             customer_phone = customer_data['customer_phone']
 
-            # Mijozning barcha qarzdorliklarini olish
-            customer_debts = get_customer_debts(customer_name, customer_phone, DATA_FILE)
+            # Mijozning qarzdorliklari va jami summalari (oldindan hisoblangan)
+            summary = get_customer_summary(customer_name, customer_phone, DATA_FILE)
+            customer_debts = summary['debts'] if summary else []
 
             # Batafsil ma'lumotni formatlash (bo'laklarga ajratilgan)
-            messages = format_customer_details(customer_debts, customer_name)
+            messages = await render_in_pool(None, format_customer_details, customer_debts, customer_name, summary)
 
             # Birinchi xabarni inline xabarni o'zgartirish orqali yuborish
             await query.edit_message_text(messages[0], parse_mode='MarkdownV2')
@@ -566,10 +650,7 @@ async def handle_customer_selection(query, context: ContextTypes.DEFAULT_TYPE, s
                 await context.bot.send_message(query.message.chat.id, message, parse_mode='MarkdownV2')
 
             # Search natijalarini tozalash
-            if user_id in user_all_search_results:
-                del user_all_search_results[user_id]
-            if user_id in user_current_page:
-                del user_current_page[user_id]
+            clear_search_session(user_id)
 
         else:
             await query.answer("❌ Noto'g'ri tanlov")
@@ -577,46 +658,51 @@ async def handle_customer_selection(query, context: ContextTypes.DEFAULT_TYPE, s
     except (ValueError, IndexError):
         await query.answer("❌ Xatolik yuz berdi")
 
-async def handle_search_navigation(query, context: ContextTypes.DEFAULT_TYPE, action: str):
-    """Qidiruv sahifalarini navigatsiya qilish"""
-    user_id = query.from_user.id
-
-    if user_id not in user_all_search_results:
-        await query.answer("❌ Qidiruv natijalari topilmadi")
-        return
-
-    current_page = user_current_page.get(user_id, 0)
-
-    if action.startswith("search_next_"):
-        new_page = current_page + 1
-    elif action.startswith("search_prev_"):
-        new_page = current_page - 1
-    else:
-        await query.answer("❌ Noto'g'ri harakat")
-        return
-
-    # Yangi sahifani olish
-    page_results, has_more = get_paginated_results(user_id, new_page, 5)
+async def show_search_page(query, user_id: int, session, page: int) -> bool:
+    """Qidiruv natijalarining berilgan sahifasini inline xabarda ko'rsatish (asl so'rov bilan)"""
+    page_results, has_more = get_paginated_results(user_id, page, RESULTS_PER_PAGE)
 
     if not page_results:
         await query.answer("❌ Bu sahifada natijalar yo'q")
-        return
+        return False
 
     # Sahifa raqamini yangilash
-    user_current_page[user_id] = new_page
+    session.page = page
+    session.stale = False
 
     # Xabar va klaviaturani yangilash
-    search_query = "qidiruv"  # Bu qiymatni saqlab turish kerak bo'ladi
-    total_results = len(user_all_search_results[user_id])
-
-    message = format_search_results_message(page_results, search_query, new_page, total_results)
-    keyboard = create_search_results_keyboard(page_results, user_id, new_page, has_more)
+    message = format_search_results_message(page_results, session.query, page, session.matches, session.total)
+    keyboard = create_search_results_keyboard(page_results, user_id, page, has_more)
 
     try:
         await query.edit_message_text(message, reply_markup=keyboard, parse_mode='MarkdownV2')
     except Exception as e:
         logger.error(f"Xabarni yangilashda xatolik: {e}")
         await query.answer("❌ Xabarni yangilashda xatolik")
+        return False
+    return True
+
+async def handle_search_navigation(query, context: ContextTypes.DEFAULT_TYPE, action: str):
+    """Qidiruv sahifalarini navigatsiya qilish"""
+    user_id = query.from_user.id
+
+    session = get_search_session(user_id)
+    if session is None:
+        await query.answer("❌ Qidiruv natijalari topilmadi")
+        return
+
+    if session.stale:
+        # Ma'lumotlar yangilangan - joriy sahifa yangi natijalar bilan qayta ko'rsatiladi
+        new_page = session.page
+    elif action.startswith("search_next_"):
+        new_page = session.page + 1
+    elif action.startswith("search_prev_"):
+        new_page = session.page - 1
+    else:
+        await query.answer("❌ Noto'g'ri harakat")
+        return
+
+    await show_search_page(query, user_id, session, new_page)
 
 # --- PROFIL O'ZGARTIRISH FUNKSIYALARI ---
 async def handle_profile_change_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -688,29 +774,25 @@ async def handle_profile_change_selection(query, context: ContextTypes.DEFAULT_T
 
 async def send_daily_reminders(context: ContextTypes.DEFAULT_TYPE):
     logger.info("Kunlik eslatmalarni yuborish boshlandi.")
-    all_debts = load_json(DATA_FILE)
-    sellers = load_json(SELLERS_FILE)
-
-    total_sent = 0
+    snapshot = get_snapshot(DATA_FILE)
+    sellers = load_sellers()
+
+    def reminder_job(user_id, seller_reports):
+        async def job(broadcast_context):
+            # Muddati o'tganlar, keyin UPCOMING_DAYS kun qolganlar
+            for report in seller_reports:
+                await deliver_report(user_id, broadcast_context, report)
+        return job
+
+    jobs = []
+    reports = []
+    total_reports = 0
     for seller_name, user_ids_data in sellers.items():
-        seller_debts = all_debts.get(seller_name, [])
-
         # Muddati o'tgan qarzdorliklar
-        overdue_debts = [debt for debt in seller_debts if "o'tdi" in debt.get('Muddati', '')]
-
-        # 5 kun qolganlar
-        upcoming_debts = []
-        for debt in seller_debts:
-            muddati = debt.get('Muddati', '')
-            if "qoldi" in muddati:
-                try:
-                    kun = int(muddati.split()[0])
-                    if 0 < kun <= 5:
-                        upcoming_debts.append(debt)
-                except (ValueError, IndexError):
-                    continue
-            elif "Bugun" in muddati:
-                upcoming_debts.append(debt)
+        overdue_debts = snapshot.seller_bucket(seller_name, BUCKET_OVERDUE)
+
+        # UPCOMING_DAYS kun qolganlar (bugungilar ham)
+        upcoming_debts = snapshot.due_within(UPCOMING_DAYS, seller_name)
 
         # Agar ikkalasi ham bo'sh bo'lsa, keyingisiga o'tish
         if not overdue_debts and not upcoming_debts:
@@ -723,48 +805,66 @@ async def send_daily_reminders(context: ContextTypes.DEFAULT_TYPE):
             user_ids = [user_ids_data]
         else:
             continue
+        if not user_ids:
+            continue
 
-        # Har bir foydalanuvchiga yuborish
+        # Hisobotlar sotuvchi uchun bir marta tayyorlanadi va barcha bog'langan hisoblarga yuboriladi
+        seller_reports = []
+        today = today_ordinal()
+        if overdue_debts:
+            seller_reports.append(await cached_render(
+                ('reminder_overdue', seller_name, today),
+                snapshot.version,
+                build_report,
+                overdue_debts,
+                "🔔 Muddati o'tgan qarzdorliklar (Kunlik eslatma)",
+                f"kunlik_muddati_otgan_{seller_name}"
+            ))
+        if upcoming_debts:
+            seller_reports.append(await cached_render(
+                ('reminder_upcoming', seller_name, UPCOMING_DAYS, today),
+                snapshot.version,
+                build_report,
+                upcoming_debts,
+                f"⏰ Yaqinlashayotgan to'lov mudatlari ({UPCOMING_DAYS} kun ichida)",
+                f"kunlik_{UPCOMING_DAYS}kun_qolgan_{seller_name}"
+            ))
+        reports.extend(seller_reports)
+
+        # Har bir foydalanuvchi - alohida vazifa (uning xabarlari tartibi saqlanadi)
         for user_id in user_ids:
-            try:
-                # Muddati o'tganlar
-                if overdue_debts:
-                    fake_update = type('Update', (), {'effective_chat': type('Chat', (), {'id': user_id})()})()
-                    await send_report(
-                        fake_update,
-                        context,
-                        overdue_debts,
-                        "🔔 Muddati o'tgan qarzdorliklar (Kunlik eslatma)",
-                        f"kunlik_muddati_otgan_{seller_name}"
-                    )
-                    total_sent += 1
-
-                # 5 kun qolganlar
-                if upcoming_debts:
-                    fake_update = type('Update', (), {'effective_chat': type('Chat', (), {'id': user_id})()})()
-                    await send_report(
-                        fake_update,
-                        context,
-                        upcoming_debts,
-                        "⏰ Yaqinlashayotgan to'lov mudatlari (5 kun ichida)",
-                        f"kunlik_5kun_qolgan_{seller_name}"
-                    )
-                    total_sent += 1
+            jobs.append((seller_name, reminder_job(user_id, seller_reports)))
+            total_reports += len(seller_reports)
 
-            except Exception as e:
-                logger.error(f"'{seller_name}' sotuvchisiga eslatma yuborishda xatolik: {e}")
+    stats = await Broadcaster(context.bot).run(jobs)
 
-    logger.info(f"Kunlik eslatmalar yuborish yakunlandi. Jami {total_sent} ta xabar yuborildi.")
+    logger.info(
+        f"Kunlik eslatmalar yuborish yakunlandi. Jami {total_reports} ta hisobot "
+        f"({len(reports)} tasi tayyorlandi), {stats['jobs'] - stats['failed']}/{stats['jobs']} ta foydalanuvchiga yuborildi."
+    )
 
-async def scheduled_job(context: ContextTypes.DEFAULT_TYPE):
-    """Rejalashtirilgan vazifa - ma'lumotlarni yangilash va eslatmalar yuborish"""
+async def scheduled_job(context: ContextTypes.DEFAULT_TYPE, full=False, kind="scheduled"):
+    """
+    Rejalashtirilgan vazifa - ma'lumotlarni yangilash va eslatmalar yuborish.
+    Yangilash bajarilayotganda chaqirilsa, yangisi boshlanmaydi - o'sha yangilash natijasi qaytariladi
+    (ma'lumotlar bir marta yuklanadi, eslatmalar bir marta yuboriladi). Bajarilayotgani eslatma
+    yubormasa yoki to'liq bo'lmasa, u tugagach navbatdagi yangilash bajariladi.
+    """
+    return await sync_coordinator.run(
+        kind, lambda full, remind: sync_and_remind(context, full, remind), full=full, remind=True
+    )
+
+async def sync_and_remind(context: ContextTypes.DEFAULT_TYPE, full=False, remind=True):
     logger.info("Rejalashtirilgan vazifa boshlandi: ma'lumotlarni yangilash")
-    success = await update_data_from_billz()
+    success = await update_data_from_billz(full=full)
+    if not remind:
+        return success
     if success:
         logger.info("Ma'lumotlar muvaffaqiyatli yangilandi, eslatmalar yuborilmoqda")
         await send_daily_reminders(context)
     else:
         await send_message_to_all_admins(context, "❌ Reja bo'yicha ma'lumotlarni yangilashda xatolik yuz berdi.")
+    return success
 
 # --- BOT BUYRUQLARI VA HANDLERLAR ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -806,10 +906,7 @@ async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
     # Search natijalarini tozalash
-    if user_id in user_all_search_results:
-        del user_all_search_results[user_id]
-    if user_id in user_current_page:
-        del user_current_page[user_id]
+    clear_search_session(user_id)
 
     # Admin user ID kutish holatini tozalash
     if is_admin(user_id) and is_waiting_for_user_id(user_id):
@@ -821,9 +918,10 @@ async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_chat.id
     message_text = update.message.text
+    role, _ = get_user_role(user_id)
 
     # Admin user ID kutayotgan holatni tekshirish
-    if is_admin(user_id) and is_waiting_for_user_id(user_id):
+    if role == ROLE_ADMIN and is_waiting_for_user_id(user_id):
         await handle_telegram_id_input(update, context, message_text)
         return
 
@@ -832,9 +930,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await handle_search_query(update, context, message_text)
         return
 
-    if is_admin(user_id):
+    if role == ROLE_ADMIN:
         await handle_admin_message(update, context, message_text)
-    elif is_seller(user_id):
+    elif role == ROLE_SELLER:
         await handle_seller_message(update, context, message_text)
     else:
         # Ruxsatsiz foydalanuvchi
@@ -845,29 +943,44 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # --- ADMIN FUNKSIYALARI ---
 async def admin_general_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    all_debts = load_json(DATA_FILE)
-    if not all_debts:
-        await update.message.reply_text("❌ Ma'lumotlar bazasi bo'sh.")
+    snapshot = get_snapshot(DATA_FILE)
+    if not snapshot:
+        await update.message.reply_text(data_age_note() or "❌ Ma'lumotlar bazasi bo'sh.")
         return
 
-    all_data = []
-    for seller_name, debts in all_debts.items():
-        all_data.extend(debts)
+    # Sinxronlashda oldindan hisoblangan yig'indilar
+    aggregates = snapshot.aggregates
+    total = aggregates['total']
 
-    total_amount = sum(d.get('Qolgan Summa', 0) for d in all_data)
-    overdue_count = len([d for d in all_data if "o'tdi" in d.get('Muddati', '')])
+    def money(amount) -> str:
+        return escape_markdown(f'{amount:,.0f}')
 
     message = (
     "📊 **UMUMIY HISOBOT**\n\n"
-    f"👥 **Sotuvchilar soni:** {len(all_debts)}\n"
-    f"💰 **Jami qarzdorliklar:** {len(all_data)} ta\n"
-    f"💵 **Umumiy summa:** {escape_markdown(f'{total_amount:,.0f}')} so'm\n"
-    f"⚡ **Muddati o'tganlar:** {overdue_count} ta\n"
+    f"👥 **Sotuvchilar soni:** {aggregates['seller_count']}\n"
+    f"💰 **Jami qarzdorliklar:** {total['count']} ta\n"
+    f"💵 **Umumiy summa:** {money(total['remaining'])} so'm\n"
+    f"⚡ **Muddati o'tganlar:** {total['overdue_count']} ta \\({money(total['overdue_remaining'])} so'm\\)\n"
     )
+
+    # Kechikish muddati bo'yicha
+    message += "\n⏳ **Kechikish bo'yicha:**\n"
+    for age, totals in aggregates['overdue_age'].items():
+        message += f"  • {escape_markdown(age)} kun: {totals['count']} ta, {money(totals['remaining'])} so'm\n"
+
+    # Status bo'yicha
+    message += "\n📌 **Status bo'yicha:**\n"
+    for status, totals in sorted(aggregates['statuses'].items(), key=lambda item: -item[1]['remaining']):
+        message += f"  • {escape_markdown(status)}: {totals['count']} ta, {money(totals['remaining'])} so'm\n"
+
+    note = data_age_note()
+    if note:
+        message += f"\n{escape_markdown(note)}"
+
     await update.message.reply_text(message, parse_mode='MarkdownV2')
 
 async def admin_sellers_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    sellers = load_json(SELLERS_FILE)
+    sellers = load_sellers()
     if not sellers:
         await update.message.reply_text("❌ Hech qanday sotuvchi ro'yxatdan o'tmagan.")
         return
@@ -901,30 +1014,30 @@ async def admin_select_seller(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.message.reply_text("👥 **Sotuvchi tanlang:**", reply_markup=keyboard)
 
 async def admin_seller_report(query, context: ContextTypes.DEFAULT_TYPE, seller_name: str):
-    all_debts = load_json(DATA_FILE)
-    seller_debts = all_debts.get(seller_name, [])
+    snapshot = get_snapshot(DATA_FILE)
+    seller_debts = snapshot.seller_debts(seller_name)
 
     # query orqali hisobot yuborish
-    await send_report(query, context, seller_debts, f"{seller_name} hisoboti", f"hisobot_{seller_name}")
+    await send_report(query, context, seller_debts, f"{seller_name} hisoboti", f"hisobot_{seller_name}", snapshot.version)
     await query.answer() # Inline tugma bosilganini bildirish
 
 async def admin_overdue_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    all_debts = load_json(DATA_FILE)
-    if not all_debts:
-        await update.message.reply_text("❌ Ma'lumotlar bazasi bo'sh.")
+    snapshot = get_snapshot(DATA_FILE)
+    if not snapshot:
+        await update.message.reply_text(data_age_note() or "❌ Ma'lumotlar bazasi bo'sh.")
         return
 
-    overdue_debts = []
-    for debts in all_debts.values():
-        overdue_debts.extend([d for d in debts if "o'tdi" in d.get('Muddati', '')])
-
-    overdue_debts.sort(key=lambda x: int(x.get('Muddati', '0').split()[0]) if "o'tdi" in x.get('Muddati', '') else 0, reverse=True)
+    # Indeks muddati bo'yicha saralangan - eng ko'p kechikkanlari birinchi
+    overdue_debts = snapshot.due_bucket(BUCKET_OVERDUE)
 
-    await send_report(update, context, overdue_debts, "Barcha muddati o'tganlar", "muddati_otganlar")
+    await send_report(update, context, overdue_debts, "Barcha muddati o'tganlar", "muddati_otganlar", snapshot.version)
 
 async def seller_report(update: Update, context: ContextTypes.DEFAULT_TYPE, seller_name: str, filter_type):
-    all_debts = load_json(DATA_FILE)
-    seller_debts = all_debts.get(seller_name, [])
+    snapshot = get_snapshot(DATA_FILE)
+    if not snapshot:
+        await update.message.reply_text(data_age_note() or "❌ Ma'lumotlar bazasi bo'sh.")
+        return
+    seller_debts = snapshot.seller_debts(seller_name)
 
     if not seller_debts:
         await update.message.reply_text("❌ Sizga biriktirilgan aktiv qarzdorliklar yo'q.")
@@ -937,41 +1050,73 @@ async def seller_report(update: Update, context: ContextTypes.DEFAULT_TYPE, sell
     if filter_type == "overdue":
         title = "Muddati o'tganlar"
         filename = f"{seller_name}_muddati_otgan"
-        filtered_debts = [d for d in seller_debts if "o'tdi" in d.get('Muddati', '')]
-        filtered_debts.sort(key=lambda x: int(x.get('Muddati', '0').split()[0]), reverse=True)
+        filtered_debts = snapshot.seller_bucket(seller_name, BUCKET_OVERDUE)
 
     elif filter_type == "all":
         title = "Barcha qarzdorliklar"
         filename = f"{seller_name}_barchasi"
         filtered_debts = seller_debts
 
-    elif filter_type == 5:
-        title = "5 kun qolganlar"
-        filename = f"{seller_name}_5_kun"
-        for d in seller_debts:
-            muddati = d.get('Muddati', '')
-            if "qoldi" in muddati:
-                try:
-                    kun = int(muddati.split()[0])
-                    if 0 < kun <= 5:
-                        filtered_debts.append(d)
-                except (ValueError, IndexError):
-                    continue
-            elif "Bugun" in muddati:
-                filtered_debts.append(d)
-        filtered_debts.sort(key=lambda x: int(x.get('Muddati', '999').split()[0]) if "qoldi" in x.get('Muddati', '') else 0)
+    elif filter_type == "upcoming":
+        title = f"{UPCOMING_DAYS} kun qolganlar"
+        filename = f"{seller_name}_{UPCOMING_DAYS}_kun"
+        filtered_debts = snapshot.due_within(UPCOMING_DAYS, seller_name)
 
     else: # "Mening hisobotim"
         title = "Mening hisobotim"
         filename = f"{seller_name}_hisobot"
         filtered_debts = seller_debts
 
-    await send_report(update, context, filtered_debts, title, filename)
+    await send_report(update, context, filtered_debts, title, filename, snapshot.version)
+
+def format_sync_progress(progress) -> str:
+    """Yangilash holati matni: bosqich, sahifalar, yozuvlar (oddiy matn)"""
+    pages = str(progress.get('pages', 0))
+    if progress.get('total_pages'):
+        pages += f"/{progress['total_pages']}"
+    stage = SYNC_STAGES.get(progress.get('stage'), progress.get('stage') or "boshlanmoqda")
+    return (
+        f"🔄 Yangilash ({stage}): {pages} ta sahifa, "
+        f"{progress.get('records', 0):,} ta yozuv, {progress.get('seconds', 0)} s"
+    )
+
+async def report_sync_progress(status_message):
+    """Yangilash tugaguncha holat xabarini vaqti-vaqti bilan yangilab turish"""
+    last_text = None
+    while True:
+        await asyncio.sleep(SYNC_PROGRESS_INTERVAL)
+        progress = sync_coordinator.progress()
+        if progress is None:
+            return
+        text = format_sync_progress(progress)
+        if text != last_text:
+            try:
+                await status_message.edit_text(text)
+                last_text = text
+            except Exception as e:
+                logger.warning(f"Yangilash holatini ko'rsatishda xatolik: {e}")
 
 async def force_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_chat.id): return
-    await update.message.reply_text("⏳ Ma'lumotlarni majburiy yangilash boshlandi...")
-    await scheduled_job(context)
+    if sync_coordinator.is_running() and sync_coordinator.covers(full=True, remind=True):
+        status_message = await update.message.reply_text("⏳ Yangilash allaqachon bajarilmoqda, uning natijasi kutilmoqda...")
+    elif sync_coordinator.is_running():
+        status_message = await update.message.reply_text("⏳ Joriy yangilash tugagach to'liq yangilash boshlanadi...")
+    else:
+        status_message = await update.message.reply_text("⏳ Ma'lumotlarni majburiy yangilash boshlandi...")
+
+    progress_task = asyncio.create_task(report_sync_progress(status_message))
+    try:
+        success = await scheduled_job(context, full=True, kind="manual")
+    finally:
+        progress_task.cancel()
+
+    stats = get_last_sync_stats()
+    if success and stats:
+        await update.message.reply_text(
+            f"📊 Yangilash: {stats.get('pages', 0)} ta sahifa, {stats.get('bytes', 0) / 1024:,.0f} KB, "
+            f"{stats.get('total', 0)} ta aktiv qarzdorlik, {stats.get('seconds', 0)} s"
+        )
 
 
 import re
@@ -985,14 +1130,16 @@ def escape_markdown(text: str) -> str:
 async def bot_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_chat.id):
         return
-    try:
-        last_update = datetime.fromtimestamp(
-            os.path.getmtime(DATA_FILE)
-        ).astimezone(TZ_UZB).strftime('%Y-%m-%d %H:%M:%S')
-    except FileNotFoundError:
+    last_sync = get_sync_time(DATA_FILE)
+    if last_sync is not None:
+        last_update = (
+            f"{datetime.fromtimestamp(last_sync).astimezone(TZ_UZB).strftime('%Y-%m-%d %H:%M:%S')} "
+            f"({format_age(get_data_age(DATA_FILE))} oldin)"
+        )
+    else:
         last_update = "Hali yangilanmagan"
 
-    sellers, all_debts = load_json(SELLERS_FILE), load_json(DATA_FILE)
+    sellers, snapshot = load_sellers(), get_snapshot(DATA_FILE)
 
     # Umumiy foydalanuvchilar sonini hisoblash
     total_users = 0
@@ -1002,7 +1149,31 @@ async def bot_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif isinstance(user_ids_data, int):
             total_users += 1
 
-    total_debts = sum(len(d) for d in all_debts.values())
+    total_debts = snapshot.aggregates['total']['count']
+
+    reminder_stats = get_last_broadcast_stats()
+    if reminder_stats:
+        reminders_line = (
+            f"🔔 **Oxirgi eslatmalar:** {reminder_stats['messages']} ta xabar, "
+            f"{escape_markdown(reminder_stats['seconds'])} s, {reminder_stats['failed']} ta xato\n"
+        )
+    else:
+        reminders_line = ""
+
+    render_stats = get_render_stats()
+    render_line = (
+        f"🧾 **Hisobotlar:** {render_stats['rendered']} ta tayyorlandi, {render_stats['coalesced']} ta birlashtirildi, "
+        f"navbat {render_stats['queue_depth']} \\(maks\\. {render_stats['max_queue_depth']}\\), "
+        f"p95 {escape_markdown(render_stats['render_p95'])} s, "
+        f"kesh {render_stats['cache_hits']}/{render_stats['cache_hits'] + render_stats['cache_misses']} "
+        f"\\({escape_markdown(render_stats['cache_mb'])} MB\\)\n"
+    )
+
+    sync_progress = sync_coordinator.progress()
+    sync_line = f"{escape_markdown(format_sync_progress(sync_progress))}\n" if sync_progress else ""
+
+    search_stats = get_search_session_stats()
+    search_line = f"🔍 **Qidiruv sessiyalari:** {search_stats['sessions']} ta \\({search_stats['results']} ta natija\\)\n"
 
     # Admin IDs xavfsiz ko'rinishi
     admin_list = ", ".join([escape_markdown(safe_user_id(admin_id)) for admin_id in ADMIN_CHAT_IDS])
@@ -1011,15 +1182,20 @@ async def bot_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = (
         f"📈 **BOT STATISTIKASI**\n\n"
         f"📊 **Oxirgi yangilanish:** {escape_markdown(last_update)}\n"
+        f"{sync_line}"
         f"👥 **Sotuvchilar soni:** {len(sellers)} ta\n"
         f"👤 **Jami foydalanuvchilar:** {total_users} ta\n"
         f"💰 **Jami aktiv qarzdorliklar:** {total_debts} ta\n"
+        f"{reminders_line}"
+        f"{render_line}"
+        f"{search_line}"
         f"🔐 **Adminlar:** {admin_list}"
     )
 
     await update.message.reply_text(message, parse_mode='MarkdownV2')
 
 async def post_init(application: Application):
+    global startup_sync_task
     scheduler = AsyncIOScheduler(timezone=TZ_UZB)  # Toshkent vaqti
 
 
@@ -1035,14 +1211,43 @@ async def post_init(application: Application):
         )
         logger.info(f"Rejalashtiruvchi qo'shildi: har kuni soat {hour:02d}:00")
 
+    # Eskirgan kutish holatlari va qidiruv sessiyalarini tozalash
+    scheduler.add_job(conversation_state.expire, 'interval', minutes=10)
+    scheduler.add_job(expire_search_sessions, 'interval', minutes=10)
+
     scheduler.start()
     logger.info("Barcha rejalashtiruvchilar muvaffaqiyatli ishga tushdi.")
 
-    # Bot ishga tushganda bir marta ma'lumotlarni yangilash
+    # Saqlangan nusxa darhol yuklanadi - bot sinxronlashni kutmasdan javob bera boshlaydi
+    await asyncio.to_thread(get_snapshot, DATA_FILE)
+    age = get_data_age(DATA_FILE)
+    logger.info(f"Saqlangan ma'lumotlar yuklandi (yoshi: {format_age(age)}), yangilash fonda boshlanadi")
+
     context_like = type('Context', (), {'bot': application.bot})()
-    await send_message_to_all_admins(context_like, "🤖 Bot qayta ishga tushdi. Ma'lumotlar yangilanmoqda...")
-    await update_data_from_billz()
-    await send_message_to_all_admins(context_like, "✅ Bot tayyor!")
+    await send_message_to_all_admins(
+        context_like,
+        "🤖 Bot qayta ishga tushdi. "
+        + (f"Saqlangan ma'lumotlar ({format_age(age)} oldingi) bilan ishlayapti, " if age is not None else "")
+        + "ma'lumotlar fonda yangilanmoqda..."
+    )
+    startup_sync_task = asyncio.create_task(startup_sync(context_like))
+
+async def startup_sync(context):
+    """Ishga tushgandagi birinchi sinxronlash: tugagach ombor yangi nusxaga almashtiriladi"""
+    success = await sync_coordinator.run("startup", lambda full, remind: sync_and_remind(context, full, remind))
+    if success:
+        await send_message_to_all_admins(context, "✅ Ma'lumotlar yangilandi.")
+    else:
+        await send_message_to_all_admins(context, "❌ Ishga tushgandagi yangilashda xatolik. Saqlangan ma'lumotlar ishlatilmoqda.")
+    return success
+
+async def post_shutdown(application: Application):
+    if is_startup_sync_running():
+        startup_sync_task.cancel()
+    sync_coordinator.cancel()
+    await close_http_client()
+    # Kechiktirilgan holat o'zgarishlarini yo'qotmaslik uchun
+    conversation_state.flush()
 
 async def scheduled_job_wrapper(bot):
     """Scheduler uchun wrapper funksiya"""
@@ -1068,11 +1273,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await handle_search_navigation(query, context, query.data)
 
     elif query.data == "search_cancel":
-        user_id = query.from_user.id
-        if user_id in user_all_search_results:
-            del user_all_search_results[user_id]
-        if user_id in user_current_page:
-            del user_current_page[user_id]
+        clear_search_session(query.from_user.id)
         await query.edit_message_text("❌ Qidiruv bekor qilindi.")
 
     elif query.data == "search_info":
@@ -1124,8 +1325,8 @@ async def handle_seller_message(update: Update, context: ContextTypes.DEFAULT_TY
         await seller_report(update, context, seller_name, None)
     elif message_text == "⏰ Muddati o'tganlar":
         await seller_report(update, context, seller_name, "overdue")
-    elif message_text == "📅 5 kun qolganlar":
-        await seller_report(update, context, seller_name, 5)
+    elif message_text == UPCOMING_BUTTON:
+        await seller_report(update, context, seller_name, "upcoming")
     elif message_text == "📈 Barcha qarzdorliklar":
         await seller_report(update, context, seller_name, "all")
     elif message_text == "🔍 Mijoz qidirish":
@@ -1134,7 +1335,11 @@ async def handle_seller_message(update: Update, context: ContextTypes.DEFAULT_TY
         await handle_profile_change_request(update, context)
 
 def main():
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).post_init(post_init).build()
+    if STORAGE_BACKEND == "sqlite":
+        # Birinchi ishga tushirishda JSON fayllardagi sotuvchilar va kutish holatlarini ko'chirish
+        database.import_json_state(SELLERS_FILE, WAITING_FOR_USER_ID_FILE, load_json)
+
+    application = Application.builder().token(TELEGRAM_BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("cancel", cancel_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
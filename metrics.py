@@ -0,0 +1,10 @@
+# metrics.py - Holat buyruqlari uchun umumiy statistik yordamchilar
+
+from typing import List
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Qiymatlarning fraction (0..1) ulushi bo'yicha persentili (bo'sh ro'yxat uchun 0)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
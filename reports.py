@@ -0,0 +1,294 @@
+# reports.py - Hisobot fayllarini yaratish (Excel) va ularni alohida ishchi oqimlarda tayyorlash
+
+import asyncio
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+from metrics import percentile
+from store import add_snapshot_hook, deadline_text, today_ordinal
+
+try:
+    import xlsxwriter
+except ImportError:  # xlsxwriter o'rnatilmagan bo'lsa - openpyxl write-only rejimi
+    xlsxwriter = None
+
+logger = logging.getLogger(__name__)
+
+EXCEL_COLUMNS = [
+    'Chek Raqami', 'Sotuvchi Ismi', 'Mijoz Ismi', 'Mijoz Telefoni',
+    'Yaratilgan Sana', 'Qarz Summasi', 'To\'langan Summa', 'Qolgan Summa',
+    'Qarz Statusi', 'To\'lov Muddati', 'Muddati'
+]
+MAX_COLUMN_WIDTH = 50
+
+# Hisobot tayyorlovchi ishchi oqimlar soni va navbat chegarasi
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_QUEUE_SIZE = int(os.getenv("REPORT_QUEUE_SIZE", "16"))
+# Tayyor hisobotlar keshi chegaralari
+REPORT_CACHE_MB = float(os.getenv("REPORT_CACHE_MB", "64"))
+REPORT_CACHE_ENTRIES = int(os.getenv("REPORT_CACHE_ENTRIES", "256"))
+SHEET_NAME = 'Hisobot'
+
+# Sarlavha ko'rinishi pandas.to_excel bilan bir xil
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(*(Side(style='thin'),) * 4)
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+def report_frame(report_data: List[Dict[str, Any]], today: Optional[int] = None) -> pd.DataFrame:
+    """Hisobot qatorlaridan Excel ustunlari tartibidagi DataFrame ("Muddati" joriy sanaga nisbatan)"""
+    today = today if today is not None else today_ordinal()
+    df = pd.DataFrame.from_records(report_data, columns=EXCEL_COLUMNS[:-1])
+    df['Muddati'] = [deadline_text(debt, today) for debt in report_data]
+    return df
+
+def column_widths(df: pd.DataFrame) -> List[int]:
+    """
+    Ustun kengliklari butun ustun bo'yicha bir martada (hujayralarni alohida aylanmasdan):
+    eng uzun qiymat + 2, ko'pi bilan MAX_COLUMN_WIDTH
+    """
+    widths = []
+    for column in df.columns:
+        lengths = df[column].astype(str).str.len()
+        max_length = max(len(str(column)), int(lengths.max()) if len(lengths) else 0)
+        widths.append(max_length + 2 if max_length < MAX_COLUMN_WIDTH else MAX_COLUMN_WIDTH)
+    return widths
+
+def report_rows(df: pd.DataFrame):
+    """Yoziladigan qatorlar: NaN -> bo'sh hujayra, numpy sonlari -> oddiy Python sonlari"""
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+def render_excel_xlsxwriter(df: pd.DataFrame) -> bytes:
+    """xlsxwriter bilan yozish - XML to'g'ridan-to'g'ri, hujayra obyektlarisiz"""
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {'in_memory': True})
+    worksheet = workbook.add_worksheet(SHEET_NAME)
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+
+    for index, width in enumerate(column_widths(df)):
+        worksheet.set_column(index, index, width)
+    worksheet.write_row(0, 0, list(df.columns), header_format)
+    for row_index, row in enumerate(report_rows(df), 1):
+        worksheet.write_row(row_index, 0, row)
+
+    workbook.close()
+    return buffer.getvalue()
+
+def render_excel_openpyxl(df: pd.DataFrame) -> bytes:
+    """openpyxl write-only rejimi: qatorlar oqim bilan yoziladi, hujayra obyektlari xotirada saqlanmaydi"""
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(SHEET_NAME)
+    # Kengliklar qatorlardan oldin berilishi kerak (write-only rejim talabi)
+    for index, width in enumerate(column_widths(df), 1):
+        worksheet.column_dimensions[get_column_letter(index)].width = width
+
+    header = []
+    for column in df.columns:
+        cell = WriteOnlyCell(worksheet, value=column)
+        cell.font, cell.border, cell.alignment = HEADER_FONT, HEADER_BORDER, HEADER_ALIGNMENT
+        header.append(cell)
+    worksheet.append(header)
+
+    for row in report_rows(df):
+        worksheet.append(row)
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def render_excel(report_data: List[Dict[str, Any]], today: Optional[int] = None) -> bytes:
+    """Hisobotni xlsx baytlariga aylantirish (xlsxwriter bo'lsa u bilan, aks holda openpyxl)"""
+    df = report_frame(report_data, today)
+    if xlsxwriter is not None:
+        return render_excel_xlsxwriter(df)
+    return render_excel_openpyxl(df)
+
+# --- HISOBOTLARNI ISHCHI OQIMLARDA TAYYORLASH ---
+class ReportRenderer:
+    """
+    CPU talab qiladigan hisobot tayyorlashni (DataFrame, xlsx, MarkdownV2) event loopdan tashqarida bajarish.
+    Navbat chegaralangan: REPORT_QUEUE_SIZE dan ortiq so'rov kelsa, yangilari joy bo'shashini kutadi.
+    Bir xil kalitli so'rovlar birlashtiriladi - bajarilayotgan natijani kutadi, qayta tayyorlanmaydi.
+    """
+
+    def __init__(self, workers: int = REPORT_WORKERS, queue_size: int = REPORT_QUEUE_SIZE):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self.queue_size = queue_size
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.in_flight: Dict[Hashable, asyncio.Task] = {}
+
+        self.depth = 0
+        self.max_depth = 0
+        self.rendered = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.render_times = deque(maxlen=500)
+        self.wait_times = deque(maxlen=500)
+
+    def _run(self, func: Callable, args: tuple, queued_at: float):
+        started = time.monotonic()
+        self.wait_times.append(started - queued_at)
+        try:
+            return func(*args)
+        finally:
+            self.render_times.append(time.monotonic() - started)
+
+    async def render(self, key: Optional[Hashable], func: Callable, *args):
+        """
+        func(*args) ni ishchi oqimda bajarish. key=None bo'lsa so'rov birlashtirilmaydi.
+        Tayyorlash alohida vazifada bajariladi - kutayotgan biror so'rov bekor qilinsa,
+        faqat o'sha so'rov to'xtaydi, shu natijani kutayotgan boshqalari emas.
+        """
+        if key is not None and key in self.in_flight:
+            self.coalesced += 1
+            return await asyncio.shield(self.in_flight[key])
+
+        task = asyncio.create_task(self._render(key, func, args))
+        # Hech kim kutmay qolsa ham xatolik "retrieved" deb belgilanadi
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        if key is not None:
+            self.in_flight[key] = task
+        return await asyncio.shield(task)
+
+    async def _render(self, key: Optional[Hashable], func: Callable, args: tuple):
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.queue_size)
+
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        try:
+            async with self._slots:
+                result = await loop.run_in_executor(self.executor, self._run, func, args, time.monotonic())
+            self.rendered += 1
+            return result
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.depth -= 1
+            if key is not None and self.in_flight.get(key) is asyncio.current_task():
+                del self.in_flight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Navbat va tayyorlash vaqti ko'rsatkichlari"""
+        render_times = list(self.render_times)
+        return {
+            'queue_depth': self.depth,
+            'max_queue_depth': self.max_depth,
+            'rendered': self.rendered,
+            'coalesced': self.coalesced,
+            'failed': self.failed,
+            'render_avg': round(sum(render_times) / len(render_times), 3) if render_times else 0.0,
+            'render_p95': round(percentile(render_times, 0.95), 3),
+            'wait_p95': round(percentile(list(self.wait_times), 0.95), 3),
+        }
+
+# --- TAYYOR HISOBOTLAR KESHI ---
+def report_size(report: Dict[str, Any]) -> int:
+    """Hisobotning xotiradagi taxminiy hajmi (matn + xlsx baytlari)"""
+    return len(report.get('content') or b'') + len(report.get('text') or '') * 2 + 256
+
+class ReportCache:
+    """
+    Tayyor hisobotlar (MarkdownV2 matn, xlsx baytlari, Telegram file_id) uchun LRU kesh.
+    Yangi nusxa e'lon qilinganda (store.replace_data) kesh darhol tozalanadi - eski hisobotlar
+    keyingi so'rovgacha xotirada qolmaydi. Eski nusxa bilan ishlayotgan (kechikkan) so'rovlar
+    keshni tozalamaydi va unga yozmaydi.
+    """
+
+    def __init__(self, max_bytes: int, max_entries: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self.size = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Hook nashr qiluvchi ishchi oqimda chaqiriladi, get/put esa hodisalar siklida
+        self._lock = threading.Lock()
+
+    def _check_version(self, version) -> bool:
+        """Versiya joriymi (yangisi bo'lsa kesh tozalanadi); eskiroq versiya uchun False"""
+        if self.version is not None and version < self.version:
+            return False
+        if version != self.version:
+            self.clear()
+            self.version = version
+        return True
+
+    def get(self, key: Hashable, version) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            report = self.entries.get(key) if self._check_version(version) else None
+            if report is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return report
+
+    def put(self, key: Hashable, version, report: Dict[str, Any]):
+        with self._lock:
+            if report.get('error') is not None or not self._check_version(version):
+                return
+            if key in self.entries:
+                self.size -= report_size(self.entries.pop(key))
+            size = report_size(report)
+            if size > self.max_bytes:
+                return
+            self.entries[key] = report
+            self.size += size
+            while self.size > self.max_bytes or len(self.entries) > self.max_entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= report_size(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def on_snapshot(self, snapshot, data_file: str):
+        """store nusxa hook'i: yangi versiyaga o'tish va eski hisobotlarni tashlab yuborish"""
+        with self._lock:
+            self._check_version(snapshot.version)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'cache_entries': len(self.entries),
+            'cache_mb': round(self.size / (1024 * 1024), 2),
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+            'cache_evictions': self.evictions,
+        }
+
+renderer = ReportRenderer()
+report_cache = ReportCache(int(REPORT_CACHE_MB * 1024 * 1024), REPORT_CACHE_ENTRIES)
+add_snapshot_hook(report_cache.on_snapshot)
+
+async def render_in_pool(key: Optional[Hashable], func: Callable, *args):
+    """Umumiy ReportRenderer orqali tayyorlash"""
+    return await renderer.render(key, func, *args)
+
+async def cached_render(key: Hashable, version, func: Callable, *args):
+    """
+    Keshdan olish, bo'lmasa ishchi oqimda tayyorlab keshga qo'yish.
+    key - (hisobot turi, sotuvchi, ..., sana), version - ma'lumotlar nusxasi versiyasi.
+    """
+    report = report_cache.get(key, version)
+    if report is None:
+        report = await render_in_pool((key, version), func, *args)
+        report_cache.put(key, version, report)
+    return report
+
+def get_render_stats() -> Dict[str, Any]:
+    return {**renderer.stats(), **report_cache.stats()}
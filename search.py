@@ -1,16 +1,28 @@
 # search.py
 
+import bisect
 import json
 import logging
-from typing import List, Dict, Any
+import os
+import re
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 from difflib import SequenceMatcher
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from store import get_snapshot, add_snapshot_hook, today_ordinal, get_due_day, deadline_text, UPCOMING_BUTTON
 
 logger = logging.getLogger(__name__)
 
-# Global o'zgaruvchi - har bir foydalanuvchi uchun search natijalarini saqlash
-user_all_search_results = {}
-user_current_page = {}
+# Qidiruv sessiyalari chegaralari
+SEARCH_SESSION_TTL = int(os.getenv("SEARCH_SESSION_TTL", "1800"))  # Oxirgi murojaatdan keyin, sekund
+SEARCH_SESSION_MAX = int(os.getenv("SEARCH_SESSION_MAX", "1000"))  # Bir vaqtda saqlanadigan sessiyalar
+SEARCH_SESSION_MAX_RESULTS = int(os.getenv("SEARCH_SESSION_MAX_RESULTS", "200"))  # Bitta sessiyadagi natijalar
+RESULTS_PER_PAGE = 5
+MIN_SIMILARITY = 0.4
+MARKDOWN_SPECIAL_CHARS = r"_*[]()~`>#+-=|{}.!"
 
 def load_json(filename: str) -> dict:
     """JSON faylni yuklash"""
@@ -28,7 +40,142 @@ def similarity_score(a: str, b: str) -> float:
     """Ikki matn orasidagi o'xshashlik darajasini hisoblash"""
     return SequenceMatcher(None, normalize_name(a), normalize_name(b)).ratio()
 
-def search_customers_by_name(search_query: str, data_file: str = "data.json", limit: int = 5, min_similarity: float = 0.4) -> List[Dict[str, Any]]:
+def name_tokens(name: str) -> List[str]:
+    """
+    Ismni belgi+tartib raqami tokenlariga ajratish ("ana" -> a1, n1, a2).
+    Ikki ism umumiy tokenlari soni ularning umumiy belgilari soniga teng -
+    bu SequenceMatcher.ratio() uchun aniq yuqori chegara (quick_ratio bilan bir xil).
+    """
+    seen = Counter()
+    tokens = []
+    for char in name:
+        seen[char] += 1
+        tokens.append(f"{char}{seen[char]}")
+    return tokens
+
+class CustomerSearchIndex:
+    """
+    Mijozlar bo'yicha qidiruv indeksi - har bir ma'lumot yangilanishida bir marta quriladi.
+
+    - mijozlar takrorlanmas (ism + telefon), birinchi uchragan qarz bo'yicha
+    - normallashtirilgan ismlar takrorlanmas, har biri uchun bir marta hisoblanadi
+    - belgi tokenlari bo'yicha inverted index - nomzodlarni tanlash uchun
+    - saralangan ismlar ro'yxati - prefiks (startswith) qidiruvi uchun
+    """
+
+    def __init__(self, data: Dict[str, List[Dict[str, Any]]]):
+        self.customers: List[Dict[str, Any]] = []
+        self.names: List[str] = []              # takrorlanmas normallashtirilgan ismlar
+        self.name_customers: List[List[int]] = []  # ism -> mijozlar indekslari
+        self.postings: Dict[str, List[int]] = {}
+        name_ids: Dict[str, int] = {}
+        seen_customers = set()
+
+        for seller_name, debts in data.items():
+            for debt in debts:
+                customer_name = debt.get('Mijoz Ismi', '').strip()
+                customer_phone = debt.get('Mijoz Telefoni', 'N/A')
+
+                if not customer_name or customer_name == 'Noma\'lum mijoz':
+                    continue
+
+                customer_key = f"{customer_name}_{customer_phone}"
+                if customer_key in seen_customers:
+                    continue
+                seen_customers.add(customer_key)
+
+                normalized = normalize_name(customer_name)
+                name_id = name_ids.get(normalized)
+                if name_id is None:
+                    name_id = name_ids[normalized] = len(self.names)
+                    self.names.append(normalized)
+                    self.name_customers.append([])
+                    for token in name_tokens(normalized):
+                        self.postings.setdefault(token, []).append(name_id)
+
+                self.name_customers[name_id].append(len(self.customers))
+                self.customers.append({
+                    'customer_name': customer_name,
+                    'customer_phone': customer_phone,
+                    'seller_name': seller_name,
+                    'remaining_amount': debt.get('Qolgan Summa', 0),
+                    'payment_date': debt.get('To\'lov Muddati', 'N/A'),
+                    'deadline': debt.get('Muddati', 'N/A'),
+                    'check_number': debt.get('Chek Raqami', 'N/A'),
+                    'debt_status': debt.get('Qarz Statusi', 'N/A')
+                })
+
+        self.sorted_names: List[Tuple[str, int]] = sorted((name, i) for i, name in enumerate(self.names))
+        self.sorted_keys: List[str] = [name for name, _ in self.sorted_names]
+
+    def prefix_matches(self, prefix: str) -> List[int]:
+        """Berilgan prefiks bilan boshlanadigan ismlar"""
+        start = bisect.bisect_left(self.sorted_keys, prefix)
+        matches = []
+        for name, name_id in self.sorted_names[start:]:
+            if not name.startswith(prefix):
+                break
+            matches.append(name_id)
+        return matches
+
+    def similar_candidates(self, query: str, min_similarity: float) -> List[int]:
+        """Umumiy belgilar soni bo'yicha min_similarity dan oshishi mumkin bo'lgan ismlar"""
+        overlap = Counter()
+        for token in name_tokens(query):
+            overlap.update(self.postings.get(token, ()))
+        query_length = len(query)
+        names = self.names
+        return [
+            name_id for name_id, common in overlap.items()
+            if 2.0 * common / (query_length + len(names[name_id])) >= min_similarity
+        ]
+
+    def search_ids(self, query: str, min_similarity: float) -> List[Tuple[int, float]]:
+        """O'xshashlik yoki prefiks bo'yicha mos mijozlar: (mijoz indeksi, o'xshashlik), o'xshashlik bo'yicha saralangan"""
+        query_for_ratio = normalize_name(query)
+        scores = {}
+        for name_id in set(self.similar_candidates(query_for_ratio, min_similarity)) | set(self.prefix_matches(query)):
+            scores[name_id] = SequenceMatcher(None, query_for_ratio, self.names[name_id]).ratio()
+
+        matched = []
+        for name_id, similarity in scores.items():
+            if similarity >= min_similarity or self.names[name_id].startswith(query):
+                for customer_id in self.name_customers[name_id]:
+                    matched.append((customer_id, similarity))
+
+        # Ma'lumotlardagi tartibni saqlab, o'xshashlik bo'yicha saralash
+        matched.sort()
+        matched.sort(key=lambda x: x[1], reverse=True)
+        return matched
+
+    def search(self, query: str, min_similarity: float) -> List[Dict[str, Any]]:
+        """O'xshashlik yoki prefiks bo'yicha mos mijozlar (o'xshashlik bo'yicha saralangan)"""
+        return [{**self.customers[customer_id], 'similarity': similarity}
+                for customer_id, similarity in self.search_ids(query, min_similarity)]
+
+# Har bir ma'lumotlar fayli uchun: (ombor versiyasi, indeks)
+_search_indexes: Dict[str, Tuple[int, CustomerSearchIndex]] = {}
+
+def search_index_for(snapshot, data_file: str = "data.json") -> CustomerSearchIndex:
+    """Berilgan nusxa uchun qidiruv indeksi (odatda nusxa almashtirilishidan oldin qurilgan bo'ladi)"""
+    cached = _search_indexes.get(data_file)
+    if cached is not None and cached[0] == snapshot.version:
+        return cached[1]
+    index = CustomerSearchIndex(snapshot.data)
+    logger.info(f"Qidiruv indeksi qurildi: {len(index.customers)} ta mijoz, {len(index.names)} ta ism")
+    # Eskiroq nusxa uchun qurilgan indeks yangisining o'rnini egallamaydi
+    if cached is None or cached[0] < snapshot.version:
+        _search_indexes[data_file] = (snapshot.version, index)
+    return index
+
+# Indeks yangi nusxa bilan birga (sinxronlashning ishchi oqimida) quriladi - birinchi qidiruv event loopni to'xtatmaydi
+add_snapshot_hook(search_index_for)
+
+def get_search_index(data_file: str = "data.json") -> CustomerSearchIndex:
+    """Joriy ma'lumotlar uchun qidiruv indeksini olish"""
+    return search_index_for(get_snapshot(data_file), data_file)
+
+def search_customers_by_name(search_query: str, data_file: str = "data.json", limit: int = 5, min_similarity: float = MIN_SIMILARITY) -> List[Dict[str, Any]]:
     """
     Mijoz ismini qidirish funksiyasi
 
@@ -41,58 +188,169 @@ def search_customers_by_name(search_query: str, data_file: str = "data.json", li
     Returns:
         Topilgan mijozlar ro'yxati
     """
-    all_debts = load_json(data_file)
-    if not all_debts:
+    snapshot = get_snapshot(data_file)
+    if not snapshot:
         return []
 
     search_query_normalized = normalize_name(search_query)
     if len(search_query_normalized) < 2:  # Juda qisqa qidiruv so'zlari uchun
         return []
 
-    results = []
-    seen_customers = set()  # Takroriy mijozlarni oldini olish uchun
+    results = get_search_index(data_file).search(search_query_normalized, min_similarity)
 
-    # Barcha sotuvchilar va ularning qarzdorliklari bo'ylab qidirish
-    for seller_name, debts in all_debts.items():
-        for debt in debts:
-            customer_name = debt.get('Mijoz Ismi', '').strip()
-            customer_phone = debt.get('Mijoz Telefoni', 'N/A')
+    logger.info(f"'{search_query}' uchun jami {len(results)} ta mijoz topildi")
+    return results
 
-            if not customer_name or customer_name == 'Noma\'lum mijoz':
-                continue
+# --- QIDIRUV SESSIYALARI ---
+class SearchSession:
+    """
+    Bitta foydalanuvchining qidiruvi: asl so'rov, joriy sahifa va natijalar -
+    mijoz lug'atlari nusxasi emas, qidiruv indeksidagi mijozlar raqamlari (array).
+    Raqamlar faqat o'zi olingan indeksda ma'noli, shuning uchun indeksga havola ham saqlanadi.
+    """
 
-            # Takroriy mijozlarni tekshirish
-            customer_key = f"{customer_name}_{customer_phone}"
-            if customer_key in seen_customers:
-                continue
+    __slots__ = ('query', 'data_file', 'version', 'index', 'customer_ids', 'matches', 'page', 'touched', 'stale')
+
+    def __init__(self, query: str, data_file: str, version: int, index: CustomerSearchIndex, customer_ids: List[int]):
+        self.query = query
+        self.data_file = data_file
+        self.version = version
+        self.index = index
+        self.customer_ids = array('I', customer_ids[:SEARCH_SESSION_MAX_RESULTS])
+        self.matches = len(customer_ids)  # Haqiqiy topilganlar soni (saqlangani SEARCH_SESSION_MAX_RESULTS gacha)
+        self.page = 0
+        self.touched = time.monotonic()
+        self.stale = False  # Ma'lumotlar yangilanib, natijalar qayta hisoblangan (eski tugmalar ishonchsiz)
+
+    @property
+    def total(self) -> int:
+        """Sessiyada saqlangan (ko'rsatiladigan) natijalar soni"""
+        return len(self.customer_ids)
+
+    def refresh(self):
+        """Ma'lumotlar yangilangan bo'lsa, asl so'rov bo'yicha natijalarni yangi indeksdan qayta olish"""
+        snapshot = get_snapshot(self.data_file)
+        if snapshot.version == self.version:
+            return
+        index = search_index_for(snapshot, self.data_file)
+        customer_ids = [customer_id for customer_id, _ in index.search_ids(normalize_name(self.query), MIN_SIMILARITY)]
+        self.customer_ids = array('I', customer_ids[:SEARCH_SESSION_MAX_RESULTS])
+        self.matches = len(customer_ids)
+        self.index = index
+        self.version = snapshot.version
+        self.page = min(self.page, max(0, (self.total - 1) // RESULTS_PER_PAGE))
+        self.stale = True
+
+    def customers(self, start: int, end: int) -> List[Dict[str, Any]]:
+        """Natijalar oralig'idagi mijozlar (raqamlar olingan indeksdan)"""
+        customers = self.index.customers
+        return [customers[customer_id] for customer_id in self.customer_ids[start:end]]
+
+class SearchSessionCache:
+    """
+    Foydalanuvchilar qidiruv sessiyalari: LRU tartibida, ko'pi bilan max_sessions ta,
+    oxirgi murojaatdan ttl sekund o'tgach o'chiriladi.
+    """
 
-            # O'xshashlik darajasini hisoblash
-            similarity = similarity_score(search_query_normalized, customer_name)
+    def __init__(self, ttl: int = SEARCH_SESSION_TTL, max_sessions: int = SEARCH_SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[int, SearchSession]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+
+    def _is_expired(self, session: SearchSession, now: float) -> bool:
+        return self.ttl > 0 and now - session.touched > self.ttl
+
+    def put(self, user_id: int, session: SearchSession):
+        with self._lock:
+            self.sessions.pop(user_id, None)
+            self.sessions[user_id] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, user_id: int, touch: bool = True) -> Optional[SearchSession]:
+        with self._lock:
+            session = self.sessions.get(user_id)
+            if session is None:
+                return None
+            now = time.monotonic()
+            if self._is_expired(session, now):
+                del self.sessions[user_id]
+                self.expirations += 1
+                return None
+            if touch:
+                session.touched = now
+                self.sessions.move_to_end(user_id)
+            return session
+
+    def pop(self, user_id: int):
+        with self._lock:
+            self.sessions.pop(user_id, None)
+
+    def expire(self) -> int:
+        """Eskirgan sessiyalarni o'chirish (rejalashtirilgan vazifa uchun)"""
+        with self._lock:
+            now = time.monotonic()
+            expired = [user_id for user_id, session in self.sessions.items() if self._is_expired(session, now)]
+            for user_id in expired:
+                del self.sessions[user_id]
+            self.expirations += len(expired)
+            return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'sessions': len(self.sessions),
+                'results': sum(session.total for session in self.sessions.values()),
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+search_sessions = SearchSessionCache()
+
+def start_search_session(user_id: int, search_query: str, data_file: str = "data.json") -> Optional[SearchSession]:
+    """
+    Qidiruvni bajarib, foydalanuvchi sessiyasini boshlash
 
-            # Qisman moslik ham tekshirish (ismning bir qismi boshlanishi)
-            partial_match = normalize_name(customer_name).startswith(search_query_normalized)
+    Returns:
+        Yangi sessiya yoki natija bo'lmasa None
+    """
+    search_query_normalized = normalize_name(search_query)
+    if len(search_query_normalized) < 2:
+        return None
 
-            if similarity >= min_similarity or partial_match:
-                results.append({
-                    'customer_name': customer_name,
-                    'customer_phone': customer_phone,
-                    'seller_name': seller_name,
-                    'similarity': similarity,
-                    'remaining_amount': debt.get('Qolgan Summa', 0),
-                    'payment_date': debt.get('To\'lov Muddati', 'N/A'),
-                    'deadline': debt.get('Muddati', 'N/A'),
-                    'check_number': debt.get('Chek Raqami', 'N/A'),
-                    'debt_status': debt.get('Qarz Statusi', 'N/A')
-                })
-                seen_customers.add(customer_key)
+    snapshot = get_snapshot(data_file)
+    index = search_index_for(snapshot, data_file)
+    matched = index.search_ids(search_query_normalized, MIN_SIMILARITY)
+    logger.info(f"'{search_query}' uchun jami {len(matched)} ta mijoz topildi")
+    if not matched:
+        search_sessions.pop(user_id)
+        return None
 
-    # Natijalarni o'xshashlik darajasi bo'yicha saralash
-    results.sort(key=lambda x: x['similarity'], reverse=True)
+    session = SearchSession(search_query.strip(), data_file, snapshot.version, index, [customer_id for customer_id, _ in matched])
+    search_sessions.put(user_id, session)
+    return session
 
-    logger.info(f"'{search_query}' uchun jami {len(results)} ta mijoz topildi")
-    return results
+def get_search_session(user_id: int) -> Optional[SearchSession]:
+    """Foydalanuvchining amaldagi qidiruv sessiyasi (ma'lumotlar yangilangan bo'lsa natijalar qayta olinadi)"""
+    session = search_sessions.get(user_id)
+    if session is not None:
+        session.refresh()
+    return session
+
+def clear_search_session(user_id: int):
+    search_sessions.pop(user_id)
 
-def get_paginated_results(user_id: int, page: int = 0, per_page: int = 5) -> tuple[List[Dict[str, Any]], bool]:
+def expire_search_sessions() -> int:
+    return search_sessions.expire()
+
+def get_search_session_stats() -> Dict[str, Any]:
+    return search_sessions.stats()
+
+def get_paginated_results(user_id: int, page: int = 0, per_page: int = RESULTS_PER_PAGE) -> tuple[List[Dict[str, Any]], bool]:
     """
     Sahifalangan natijalarni olish
 
@@ -104,15 +362,24 @@ def get_paginated_results(user_id: int, page: int = 0, per_page: int = 5) -> tup
     Returns:
         tuple: (sahifa_natijalari, keyingi_sahifa_bormi)
     """
-    all_results = user_all_search_results.get(user_id, [])
+    session = get_search_session(user_id)
+    if session is None or page < 0:
+        return [], False
     start_index = page * per_page
     end_index = start_index + per_page
 
-    page_results = all_results[start_index:end_index]
-    has_more = end_index < len(all_results)
+    page_results = session.customers(start_index, end_index)
+    has_more = end_index < session.total
 
     return page_results, has_more
 
+def get_session_customer(user_id: int, index: int) -> Optional[Dict[str, Any]]:
+    """Sessiya natijalaridagi index-o'rindagi mijoz"""
+    session = get_search_session(user_id)
+    if session is None or not 0 <= index < session.total:
+        return None
+    return session.customers(index, index + 1)[0]
+
 def get_customer_debts(customer_name: str, customer_phone: str, data_file: str = "data.json") -> List[Dict[str, Any]]:
     """
     Tanlangan mijozning barcha qarzdorliklarini olish
@@ -125,19 +392,22 @@ def get_customer_debts(customer_name: str, customer_phone: str, data_file: str =
     Returns:
         Mijozning barcha qarzdorliklari
     """
-    all_debts = load_json(data_file)
-    if not all_debts:
-        return []
+    return list(get_snapshot(data_file).customer_debts(customer_name, customer_phone))
 
-    customer_debts = []
+def get_customer_summary(customer_name: str, customer_phone: str, data_file: str = "data.json") -> Optional[Dict[str, Any]]:
+    """
+    Tanlangan mijozning oldindan hisoblangan yig'indilarini olish
 
-    for seller_name, debts in all_debts.items():
-        for debt in debts:
-            if (debt.get('Mijoz Ismi', '') == customer_name and
-                debt.get('Mijoz Telefoni', '') == customer_phone):
-                customer_debts.append(debt)
+    Args:
+        customer_name: Mijoz ismi
+        customer_phone: Mijoz telefoni
+        data_file: Ma'lumotlar fayli
 
-    return customer_debts
+    Returns:
+        Qarzdorliklar ro'yxati va jami summalar (debts, total_original, total_paid,
+        remaining, overdue_count, earliest_due) yoki None
+    """
+    return get_snapshot(data_file).customer_summary(customer_name, customer_phone)
 
 def create_search_results_keyboard(page_results: List[Dict[str, Any]], user_id: int, current_page: int, has_more: bool) -> InlineKeyboardMarkup:
     """
@@ -157,7 +427,7 @@ def create_search_results_keyboard(page_results: List[Dict[str, Any]], user_id:
 
     keyboard = []
 
-    start_index = current_page * 5
+    start_index = current_page * RESULTS_PER_PAGE
     for i, result in enumerate(page_results):
         customer_name = result['customer_name']
         remaining_amount = result['remaining_amount']
@@ -193,8 +463,9 @@ def create_search_results_keyboard(page_results: List[Dict[str, Any]], user_id:
     if navigation_row:
         keyboard.append(navigation_row)
 
-    total_results = len(user_all_search_results.get(user_id, []))
-    total_pages = (total_results + 4) // 5
+    session = search_sessions.get(user_id, touch=False)
+    total_results = session.matches if session is not None else len(page_results)
+    total_pages = ((session.total if session is not None else len(page_results)) + 4) // 5
     info_row = [
         InlineKeyboardButton(
             f"📄 {current_page + 1}/{total_pages} ({total_results} ta)",
@@ -208,41 +479,57 @@ def create_search_results_keyboard(page_results: List[Dict[str, Any]], user_id:
 
     return InlineKeyboardMarkup(keyboard)
 
-def format_search_results_message(page_results: List[Dict[str, Any]], search_query: str, current_page: int, total_results: int) -> str:
+def escape_markdown(text: str) -> str:
+    """MarkdownV2 uchun maxsus belgilarni escape qilish"""
+    return re.sub(f"([{re.escape(MARKDOWN_SPECIAL_CHARS)}])", r"\\\1", str(text))
+
+def format_search_results_message(page_results: List[Dict[str, Any]], search_query: str, current_page: int, total_results: int,
+                                  shown_results: Optional[int] = None) -> str:
+    """shown_results - sahifalanadigan natijalar soni, agar topilganlar (total_results) qisqartirilgan bo'lsa"""
+    search_query = escape_markdown(search_query)
     if not page_results:
         return f"❌ '{search_query}' bo'yicha mijozlar topilmadi\\."
 
-    total_pages = (total_results + 4) // 5
+    if shown_results is None:
+        shown_results = total_results
+    total_pages = (shown_results + 4) // 5
+    shown_note = f", ko'rsatilgan: {shown_results} ta" if shown_results < total_results else ""
     message = (
         f"🔍 **'{search_query}'** bo'yicha natijalar\n"
-        f"📄 Sahifa {current_page + 1}/{total_pages} \\(Jami: {total_results} ta\\)\n\n"
+        f"📄 Sahifa {current_page + 1}/{total_pages} \\(Jami: {total_results} ta{shown_note}\\)\n\n"
         "👇 Batafsil ma'lumot uchun mijozni tanlang:"
     )
     return message
 
-def format_customer_details(customer_debts: List[Dict[str, Any]], customer_name: str) -> List[str]:
+def format_customer_details(customer_debts: List[Dict[str, Any]], customer_name: str, summary: Optional[Dict[str, Any]] = None) -> List[str]:
     """
     Mijozning batafsil ma'lumotlarini formatlash (bo'laklarga ajratib)
 
     Args:
         customer_debts: Mijozning qarzdorliklari
         customer_name: Mijoz ismi
+        summary: Oldindan hisoblangan yig'indilar (get_customer_summary), bo'lmasa qayta hisoblanadi
 
     Returns:
         Formatlangan xabarlar ro'yxati
     """
-    # MarkdownV2 uchun escape funksiyasi
-    def escape_markdown(text: str) -> str:
-        import re
-        escape_chars = r"_*[]()~`>#+-=|{}.!"
-        return re.sub(f"([{re.escape(escape_chars)}])", r"\\\1", str(text))
-
     if not customer_debts:
         return [f"❌ {escape_markdown(customer_name)} uchun qarzdorliklar topilmadi\\."]
 
-    total_debt = sum(debt.get('Qolgan Summa', 0) for debt in customer_debts)
-    total_original = sum(debt.get('Qarz Summasi', 0) for debt in customer_debts)
-    total_paid = sum(debt.get('To\'langan Summa', 0) for debt in customer_debts)
+    if summary is not None:
+        total_debt = summary['remaining']
+        total_original = summary['total_original']
+        total_paid = summary['total_paid']
+        overdue_count = summary['overdue_count']
+        earliest_due = summary['earliest_due']
+    else:
+        total_debt = sum(debt.get('Qolgan Summa', 0) for debt in customer_debts)
+        total_original = sum(debt.get('Qarz Summasi', 0) for debt in customer_debts)
+        total_paid = sum(debt.get('To\'langan Summa', 0) for debt in customer_debts)
+        today = today_ordinal()
+        overdue_count = sum(1 for debt in customer_debts if (get_due_day(debt) or today) < today)
+        due_dates = [debt.get('To\'lov Muddati') for debt in customer_debts if debt.get('To\'lov Muddati') not in (None, '', 'N/A')]
+        earliest_due = min(due_dates) if due_dates else None
 
     # Asosiy ma'lumotlar
     header_message = (
@@ -251,7 +538,9 @@ def format_customer_details(customer_debts: List[Dict[str, Any]], customer_name:
         f"💸 **Umumiy qarz:** {escape_markdown(f'{total_original:,.0f}')} so'm\n"
         f"✅ **To'langan:** {escape_markdown(f'{total_paid:,.0f}')} so'm\n"
         f"💰 **Qolgan:** {escape_markdown(f'{total_debt:,.0f}')} so'm\n"
-        f"🔢 **Qarzdorliklar soni:** {len(customer_debts)} ta\n\n"
+        f"🔢 **Qarzdorliklar soni:** {len(customer_debts)} ta\n"
+        f"⚡ **Muddati o'tganlar:** {overdue_count} ta\n"
+        f"🗓️ **Eng erta muddat:** {escape_markdown(earliest_due or 'N/A')}\n\n"
         "**📋 BATAFSIL MA'LUMOTLAR:**"
     )
 
@@ -264,7 +553,7 @@ def format_customer_details(customer_debts: List[Dict[str, Any]], customer_name:
         paid_amount = debt.get('To\'langan Summa', 0)
         remaining_amount = debt.get('Qolgan Summa', 0)
         payment_date = debt.get('To\'lov Muddati', 'N/A')
-        deadline = debt.get('Muddati', 'N/A')
+        deadline = deadline_text(debt)
         seller_name = debt.get('Sotuvchi Ismi', 'N/A')
         debt_status = debt.get('Qarz Statusi', 'N/A')
         created_date = debt.get('Yaratilgan Sana', 'N/A')
@@ -306,7 +595,7 @@ def is_search_query(text: str) -> bool:
         return False
 
     button_texts = [
-        "📊 Mening hisobotim", "⏰ Muddati o'tganlar", "📅 5 kun qolganlar",
+        "📊 Mening hisobotim", "⏰ Muddati o'tganlar", UPCOMING_BUTTON,
         "📈 Barcha qarzdorliklar", "📊 Umumiy hisobot", "👥 Sotuvchilar ro'yxati",
         "🔄 Ma'lumotlarni yangilash", "📈 Bot statistikasi", "💰 Sotuvchi bo'yicha hisobot",
         "⚡ Muddati o'tganlar", "🔍 Mijoz qidirish"
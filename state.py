@@ -0,0 +1,149 @@
+# state.py - Suhbat holati (admin qaysi sotuvchi uchun user ID kutayotgani) xotirada,
+# ixtiyoriy kechiktirilgan (write-behind) saqlash va eskirgan holatlarni o'chirish bilan
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+import database
+from storage import save_json, load_json
+
+logger = logging.getLogger(__name__)
+
+PENDING_ACTION_TTL = int(os.getenv("PENDING_ACTION_TTL", "900"))  # Kutish holati amal qilish muddati, sekund
+STATE_PERSIST = os.getenv("STATE_PERSIST", "1") != "0"  # "0" - faqat xotirada (qayta ishga tushganda yo'qoladi)
+STATE_FLUSH_DELAY = float(os.getenv("STATE_FLUSH_DELAY", "2"))  # O'zgarishlar shuncha sekunddan keyin yoziladi
+
+# {admin_id: (sotuvchi nomi, yaratilgan vaqt)}
+Actions = Dict[int, Tuple[str, float]]
+
+class JsonStateBackend:
+    """waiting_for_user_id.json fayli"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+    def load(self) -> Actions:
+        actions = {}
+        for admin_id, value in load_json(self.filename).items():
+            if isinstance(value, dict):
+                actions[int(admin_id)] = (value.get('seller_name'), value.get('created_at', time.time()))
+            else:
+                # Eski format - faqat sotuvchi nomi
+                actions[int(admin_id)] = (value, time.time())
+        return {admin_id: action for admin_id, action in actions.items() if action[0]}
+
+    def save(self, actions: Actions):
+        save_json({
+            str(admin_id): {'seller_name': seller_name, 'created_at': created_at}
+            for admin_id, (seller_name, created_at) in actions.items()
+        }, self.filename)
+
+class SqliteStateBackend:
+    """SQLite pending_actions jadvali"""
+
+    def load(self) -> Actions:
+        return database.load_pending_actions()
+
+    def save(self, actions: Actions):
+        database.save_pending_actions(actions)
+
+class ConversationStateStore:
+    """
+    Kutish holatlari xotirada - xabarlarni yo'naltirishda diskka murojaat qilinmaydi.
+    backend berilsa, o'zgarishlar flush_delay sekunddan keyin bitta yozuv bilan saqlanadi
+    va qayta ishga tushganda yuklanadi. ttl dan eski holatlar o'chiriladi.
+    """
+
+    def __init__(self, backend=None, ttl: int = PENDING_ACTION_TTL, flush_delay: float = STATE_FLUSH_DELAY):
+        self.backend = backend
+        self.ttl = ttl
+        self.flush_delay = flush_delay
+        self._actions: Actions = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.backend is not None:
+            try:
+                self._actions = self.backend.load()
+            except Exception as e:
+                logger.error(f"Suhbat holatini yuklab bo'lmadi: {e}")
+        self._expire()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - created_at > self.ttl
+
+    def _expire(self) -> int:
+        now = time.time()
+        expired = [admin_id for admin_id, (_, created_at) in self._actions.items() if self._is_expired(created_at, now)]
+        for admin_id in expired:
+            del self._actions[admin_id]
+        if expired:
+            self._schedule_flush()
+        return len(expired)
+
+    def _schedule_flush(self):
+        if self.backend is None or self._timer is not None:
+            return
+        self._timer = threading.Timer(self.flush_delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def get(self, admin_id: int) -> Optional[str]:
+        """Admin kutayotgan sotuvchi nomi (yo'q yoki eskirgan bo'lsa None)"""
+        with self._lock:
+            self._ensure_loaded()
+            action = self._actions.get(admin_id)
+            if action is None:
+                return None
+            if self._is_expired(action[1], time.time()):
+                del self._actions[admin_id]
+                self._schedule_flush()
+                return None
+            return action[0]
+
+    def set(self, admin_id: int, seller_name: str):
+        with self._lock:
+            self._ensure_loaded()
+            self._actions[admin_id] = (seller_name, time.time())
+            self._schedule_flush()
+
+    def clear(self, admin_id: int):
+        with self._lock:
+            self._ensure_loaded()
+            if self._actions.pop(admin_id, None) is not None:
+                self._schedule_flush()
+
+    def expire(self) -> int:
+        """Eskirgan holatlarni o'chirish (rejalashtirilgan vazifa uchun)"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._expire()
+
+    def flush(self):
+        """Kutilayotgan o'zgarishlarni darhol saqlash"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self.backend is None or not self._loaded:
+                return
+            actions = dict(self._actions)
+            try:
+                self.backend.save(actions)
+            except Exception as e:
+                logger.error(f"Suhbat holatini saqlab bo'lmadi: {e}")
+
+def create_state_store(waiting_file: str, storage_backend: str) -> ConversationStateStore:
+    """Sozlamalar bo'yicha holat ombori: xotirada, kerak bo'lsa fayl yoki SQLite bilan"""
+    if not STATE_PERSIST:
+        return ConversationStateStore()
+    if storage_backend == "sqlite":
+        return ConversationStateStore(SqliteStateBackend())
+    return ConversationStateStore(JsonStateBackend(waiting_file))
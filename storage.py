@@ -0,0 +1,150 @@
+# storage.py - Fayllarni xavfsiz saqlash: vaqtinchalik faylga yozib, keyin atomik almashtirish
+
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# "json" - fayllar (data.json, sellers.json ...), "sqlite" - database.py dagi SQLite bazasi
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+# "json" - ixcham JSON (indentatsiyasiz), "pickle" - ikkilik format (protocol 5, tezroq)
+STORAGE_FORMAT = os.getenv("STORAGE_FORMAT", "json")
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "3"))  # Saqlanadigan eski versiyalar soni
+if SNAPSHOT_KEEP < 1:
+    # Oxirgi versiya asosiy fayl bilan bir (hard link) - kamida bittasi qolishi shart
+    logger.warning(f"SNAPSHOT_KEEP={SNAPSHOT_KEEP} noto'g'ri, 1 ishlatiladi")
+    SNAPSHOT_KEEP = 1
+
+def atomic_write(filename, payload: bytes):
+    """
+    Faylni atomik yozish: avval shu papkadagi vaqtinchalik faylga, keyin os.replace.
+    O'quvchilar hech qachon yarim yozilgan faylni ko'rmaydi.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(filename)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def dump_bytes(data, fmt="json") -> bytes:
+    """Ma'lumotlarni tanlangan formatda baytlarga aylantirish"""
+    if fmt == "pickle":
+        return pickle.dumps(data, protocol=5)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def load_bytes(payload: bytes, fmt="json"):
+    """Baytlardan ma'lumotlarni tiklash"""
+    if fmt == "pickle":
+        return pickle.loads(payload)
+    return json.loads(payload)
+
+# --- JSON FAYL BILAN ISHLASH FUNKSIYALARI ---
+def save_json(data, filename):
+    """JSON ma'lumotlarni faylga atomik saqlash"""
+    atomic_write(filename, dump_bytes(data))
+
+def load_json(filename):
+    """JSON faylni yuklash (fayl yo'q yoki buzilgan bo'lsa - bo'sh lug'at)"""
+    if not os.path.exists(filename):
+        return {}
+    try:
+        with open(filename, 'rb') as f:
+            return load_bytes(f.read())
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return {}
+
+# --- ASOSIY MA'LUMOTLAR (data.json) - VERSIYALANGAN NUSXALAR BILAN ---
+def data_path(filename, fmt=None):
+    """Tanlangan format uchun asosiy fayl yo'li (pickle uchun kengaytma .pickle)"""
+    fmt = fmt or STORAGE_FORMAT
+    if fmt == "pickle":
+        return f"{os.path.splitext(filename)[0]}.pickle"
+    return filename
+
+def find_data_path(filename, fmt=None):
+    """
+    Mavjud asosiy fayl yo'li. STORAGE_FORMAT=pickle ga o'tilganda .pickle fayl hali yo'q bo'lsa,
+    avvalgi JSON fayl o'qiladi (keyingi saqlashda pickle yoziladi)
+    """
+    fmt = fmt or STORAGE_FORMAT
+    path = data_path(filename, fmt)
+    if fmt != "json" and not os.path.exists(path) and os.path.exists(data_path(filename, "json")):
+        return data_path(filename, "json")
+    return path
+
+def list_snapshots(filename, fmt=None):
+    """Faylning saqlangan versiyalari (eskisidan yangisiga)"""
+    path = data_path(filename, fmt)
+    stem, ext = os.path.splitext(os.path.basename(path))
+    directory = os.path.join(os.path.dirname(os.path.abspath(path)), SNAPSHOT_DIR)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith(f"{stem}.") and name.endswith(ext)
+    )
+
+def save_data(data, filename, fmt=None):
+    """
+    Asosiy ma'lumotlarni saqlash: yangi versiya snapshots/ papkasiga yoziladi,
+    so'ng asosiy fayl atomik ravishda shu versiyaga almashtiriladi.
+    Eng oxirgi SNAPSHOT_KEEP ta versiya qoldiriladi.
+
+    Returns:
+        Yozilgan versiya fayli yo'li
+    """
+    fmt = fmt or STORAGE_FORMAT
+    path = data_path(filename, fmt)
+    stem, ext = os.path.splitext(os.path.basename(path))
+    directory = os.path.join(os.path.dirname(os.path.abspath(path)), SNAPSHOT_DIR)
+    os.makedirs(directory, exist_ok=True)
+
+    version = datetime.now().strftime('%Y%m%dT%H%M%S_%f')
+    snapshot_path = os.path.join(directory, f"{stem}.{version}{ext}")
+    atomic_write(snapshot_path, dump_bytes(data, fmt))
+
+    # Asosiy faylni nusxalamasdan (hard link) almashtirish, imkon bo'lmasa - nusxalash
+    tmp_path = f"{path}.{version}.tmp"
+    try:
+        os.link(snapshot_path, tmp_path)
+    except OSError:
+        shutil.copyfile(snapshot_path, tmp_path)
+    os.replace(tmp_path, path)
+
+    snapshots = list_snapshots(filename, fmt)
+    for old_snapshot in snapshots[:max(len(snapshots) - SNAPSHOT_KEEP, 0)]:
+        try:
+            os.remove(old_snapshot)
+        except OSError as e:
+            logger.warning(f"Eski versiyani o'chirib bo'lmadi ({old_snapshot}): {e}")
+
+    return snapshot_path
+
+def load_data(filename, fmt=None):
+    """Asosiy ma'lumotlarni yuklash (fayl yo'q yoki buzilgan bo'lsa - bo'sh lug'at)"""
+    fmt = fmt or STORAGE_FORMAT
+    path = find_data_path(filename, fmt)
+    if not os.path.exists(path):
+        return {}
+    if path != data_path(filename, fmt):
+        logger.info(f"{data_path(filename, fmt)} hali yo'q - ma'lumotlar {path} dan o'qiladi")
+        fmt = "json"
+    try:
+        with open(path, 'rb') as f:
+            return load_bytes(f.read(), fmt)
+    except (json.JSONDecodeError, UnicodeDecodeError, pickle.UnpicklingError, EOFError) as e:
+        logger.error(f"{path} faylini o'qib bo'lmadi: {e}")
+        return {}
@@ -0,0 +1,432 @@
+# store.py - Qarzdorliklar uchun xotiradagi ombor (har bir yangilanishdan keyin bir marta yuklanadi)
+
+import bisect
+import logging
+import os
+import threading
+import time
+from datetime import datetime, date
+from typing import List, Dict, Any, Callable, Optional, Tuple
+import pytz
+from storage import load_data, save_data, find_data_path, STORAGE_BACKEND
+import database
+
+logger = logging.getLogger(__name__)
+
+DATA_FILE = "data.json"
+TZ_UZB = pytz.timezone('Asia/Tashkent')
+
+# To'lov muddati kun raqami sifatida (date.toordinal()), sana noma'lum bo'lsa None.
+# Saralash va filtrlash shu butun son bilan bajariladi, "Muddati" matni esa yuborish vaqtida yasaladi.
+DUE_DAY_KEY = 'Muddat Kuni'
+
+# "N kun qolganlar" hisoboti va kunlik eslatma uchun kunlar soni
+UPCOMING_DAYS = int(os.getenv("UPCOMING_DAYS", "5"))
+UPCOMING_BUTTON = f"📅 {UPCOMING_DAYS} kun qolganlar"
+
+# Muddat guruhlari
+BUCKET_OVERDUE = "overdue"    # Muddati o'tgan
+BUCKET_TODAY = "today"        # Bugun
+BUCKET_UPCOMING = "upcoming"  # Muddati hali kelmagan
+BUCKET_UNKNOWN = "unknown"    # Muddat noma'lum
+
+def today_ordinal() -> int:
+    """Toshkent vaqti bo'yicha bugungi kun raqami"""
+    return datetime.now(TZ_UZB).date().toordinal()
+
+def parse_due_day(repayment_date) -> Optional[int]:
+    """'YYYY-MM-DD' ko'rinishidagi sanani kun raqamiga aylantirish"""
+    try:
+        return date.fromisoformat(repayment_date).toordinal()
+    except (ValueError, TypeError):
+        return None
+
+def get_due_day(debt: Dict[str, Any]) -> Optional[int]:
+    """Qarzdorlikning to'lov muddati (kun raqami)"""
+    if DUE_DAY_KEY in debt:
+        return debt[DUE_DAY_KEY]
+    # Eski formatdagi ma'lumotlar uchun
+    return parse_due_day(debt.get('To\'lov Muddati'))
+
+def days_left(debt: Dict[str, Any], today: Optional[int] = None) -> Optional[int]:
+    """Muddatgacha qolgan kunlar (manfiy - muddati o'tgan), sana noma'lum bo'lsa None"""
+    due_day = get_due_day(debt)
+    if due_day is None:
+        return None
+    return due_day - (today if today is not None else today_ordinal())
+
+def get_deadline_text(days_diff: int) -> str:
+    """Kunlar farqini matnga aylantirish"""
+    if days_diff < 0:
+        return f"{abs(days_diff)} kun o'tdi"
+    elif days_diff == 0:
+        return "Bugun"
+    return f"{days_diff} kun qoldi"
+
+def deadline_text(debt: Dict[str, Any], today: Optional[int] = None) -> str:
+    """'Muddati' ustuni matni - joriy sanaga nisbatan"""
+    days_diff = days_left(debt, today)
+    return get_deadline_text(days_diff) if days_diff is not None else "N/A"
+
+def get_due_bucket(debt: Dict[str, Any], today: Optional[int] = None) -> str:
+    """Qarzdorlikni muddat guruhiga ajratish"""
+    days_diff = days_left(debt, today)
+    if days_diff is None:
+        return BUCKET_UNKNOWN
+    if days_diff < 0:
+        return BUCKET_OVERDUE
+    if days_diff == 0:
+        return BUCKET_TODAY
+    return BUCKET_UPCOMING
+
+# Muddati o'tganlarning kechikish muddati bo'yicha guruhlari: (nomi, dan, gacha) kun
+OVERDUE_AGE_BUCKETS = [("0-7", 0, 7), ("8-30", 8, 30), ("31-90", 31, 90), ("90+", 91, None)]
+
+def overdue_age_bucket(days_overdue: int) -> str:
+    """Kechikish kunlari bo'yicha guruh nomi"""
+    for name, low, high in OVERDUE_AGE_BUCKETS:
+        if days_overdue >= low and (high is None or days_overdue <= high):
+            return name
+    return OVERDUE_AGE_BUCKETS[-1][0]
+
+def new_totals() -> Dict[str, Any]:
+    """Yig'indilar jadvali yozuvi (sotuvchi, status yoki umumiy)"""
+    return {'count': 0, 'original': 0, 'paid': 0, 'remaining': 0, 'overdue_count': 0, 'overdue_remaining': 0}
+
+def compute_aggregates(data: Dict[str, List[Dict[str, Any]]], today: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Boshqaruv paneli uchun yig'indilar: umumiy, sotuvchilar, statuslar va kechikish guruhlari bo'yicha.
+    Sinxronlashda bir marta hisoblanadi, hisobotlar tayyor qiymatlarni o'qiydi.
+    """
+    today = today if today is not None else today_ordinal()
+    total = new_totals()
+    by_seller: Dict[str, Dict[str, Any]] = {}
+    by_status: Dict[str, Dict[str, Any]] = {}
+    by_overdue_age = {name: new_totals() for name, _, _ in OVERDUE_AGE_BUCKETS}
+
+    for seller_name, debts in data.items():
+        seller_totals = by_seller[seller_name] = new_totals()
+        for debt in debts:
+            status_totals = by_status.setdefault(debt.get('Qarz Statusi', 'N/A'), new_totals())
+            original = debt.get('Qarz Summasi', 0)
+            paid = debt.get('To\'langan Summa', 0)
+            remaining = debt.get('Qolgan Summa', 0)
+            due_day = get_due_day(debt)
+            targets = [total, seller_totals, status_totals]
+            if due_day is not None and due_day < today:
+                targets.append(by_overdue_age[overdue_age_bucket(today - due_day)])
+            for totals in targets:
+                totals['count'] += 1
+                totals['original'] += original
+                totals['paid'] += paid
+                totals['remaining'] += remaining
+                if due_day is not None and due_day < today:
+                    totals['overdue_count'] += 1
+                    totals['overdue_remaining'] += remaining
+
+    return {
+        'date': today,
+        'seller_count': len(data),
+        'total': total,
+        'sellers': by_seller,
+        'statuses': by_status,
+        'overdue_age': by_overdue_age,
+    }
+
+def new_customer_summary() -> Dict[str, Any]:
+    """Mijoz bo'yicha yig'indi jadvali yozuvi"""
+    return {
+        'debts': [],
+        'total_original': 0,
+        'total_paid': 0,
+        'remaining': 0,
+        'overdue_count': 0,
+        'earliest_due': None,
+        'due_days': [],  # saralangan muddatlar - overdue_count so'rov vaqtida hisoblanadi
+    }
+
+class DueDateIndex:
+    """
+    To'lov muddati bo'yicha saralangan qarzdorliklar.
+    Muddat guruhlari va "N kun ichida" so'rovlari bisect orqali olinadigan tayyor saralangan bo'laklar -
+    ish hajmi natija hajmiga proporsional, sana o'zgarganda qayta qurish shart emas.
+    """
+
+    def __init__(self, debts: List[Dict[str, Any]]):
+        dated = [debt for debt in debts if get_due_day(debt) is not None]
+        # Barqaror saralash - bir kundagi qarzlar asl tartibida qoladi
+        dated.sort(key=get_due_day)
+        self.debts: List[Dict[str, Any]] = dated
+        self.days: List[int] = [get_due_day(debt) for debt in dated]
+        self.unknown: List[Dict[str, Any]] = [debt for debt in debts if get_due_day(debt) is None]
+
+    def between(self, start: Optional[int] = None, end: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Muddati [start, end] oralig'idagi qarzdorliklar (kun raqamlari, ikkala chegara ham kiradi)"""
+        lo = 0 if start is None else bisect.bisect_left(self.days, start)
+        hi = len(self.days) if end is None else bisect.bisect_right(self.days, end)
+        return self.debts[lo:hi]
+
+    def count_between(self, start: Optional[int] = None, end: Optional[int] = None) -> int:
+        """between() natijasining soni (ro'yxat yaratmasdan)"""
+        lo = 0 if start is None else bisect.bisect_left(self.days, start)
+        hi = len(self.days) if end is None else bisect.bisect_right(self.days, end)
+        return max(hi - lo, 0)
+
+    def bucket(self, bucket: str, today: int) -> List[Dict[str, Any]]:
+        """Muddat guruhi - eng eski muddatdan boshlab saralangan"""
+        if bucket == BUCKET_OVERDUE:
+            return self.between(end=today - 1)
+        if bucket == BUCKET_TODAY:
+            return self.between(today, today)
+        if bucket == BUCKET_UPCOMING:
+            return self.between(start=today + 1)
+        return self.unknown
+
+EMPTY_DUE_INDEX = DueDateIndex([])
+
+class DebtSnapshot:
+    """
+    Ma'lumotlarning bir nusxasi va undan qurilgan indekslar.
+    Yaratilgandan keyin o'zgartirilmaydi - yangilanishda butunlay almashtiriladi.
+    """
+
+    def __init__(self, data: Dict[str, List[Dict[str, Any]]], version: int = 0, aggregates: Optional[Dict[str, Any]] = None):
+        self.data = data or {}
+        self.version = version
+        self.loaded_at = time.time()
+        self._aggregates = aggregates
+
+        self.sellers: List[str] = sorted(self.data.keys())
+        self.all_debts: List[Dict[str, Any]] = []
+        self.by_customer: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.by_status: Dict[str, List[Dict[str, Any]]] = {}
+
+        for seller_name, debts in self.data.items():
+            for debt in debts:
+                if DUE_DAY_KEY not in debt:
+                    # Eski formatdagi data.json - muddatni bir marta hisoblab qo'yamiz
+                    debt[DUE_DAY_KEY] = parse_due_day(debt.get('To\'lov Muddati'))
+                self.all_debts.append(debt)
+
+                customer_key = (debt.get('Mijoz Ismi', ''), debt.get('Mijoz Telefoni', ''))
+                summary = self.by_customer.get(customer_key)
+                if summary is None:
+                    summary = self.by_customer[customer_key] = new_customer_summary()
+                summary['debts'].append(debt)
+                summary['total_original'] += debt.get('Qarz Summasi', 0)
+                summary['total_paid'] += debt.get('To\'langan Summa', 0)
+                summary['remaining'] += debt.get('Qolgan Summa', 0)
+                due_day = debt[DUE_DAY_KEY]
+                if due_day is not None:
+                    summary['due_days'].append(due_day)
+                    due_date = debt.get('To\'lov Muddati')
+                    if summary['earliest_due'] is None or due_date < summary['earliest_due']:
+                        summary['earliest_due'] = due_date
+
+                self.by_status.setdefault(debt.get('Qarz Statusi', 'N/A'), []).append(debt)
+
+        for summary in self.by_customer.values():
+            summary['due_days'].sort()
+
+        self.due_index = DueDateIndex(self.all_debts)
+        self.seller_due_index: Dict[str, DueDateIndex] = {
+            seller_name: DueDateIndex(debts) for seller_name, debts in self.data.items()
+        }
+
+    def __bool__(self) -> bool:
+        return bool(self.data)
+
+    @property
+    def aggregates(self) -> Dict[str, Any]:
+        """Yig'indilar (sinxronlashda hisoblangan; sana o'zgargan bo'lsa bir marta qayta hisoblanadi)"""
+        aggregates = self._aggregates
+        if aggregates is None or aggregates['date'] != today_ordinal():
+            aggregates = self._aggregates = compute_aggregates(self.data)
+        return aggregates
+
+    def _due_index(self, seller_name: Optional[str] = None) -> DueDateIndex:
+        if seller_name is None:
+            return self.due_index
+        return self.seller_due_index.get(seller_name, EMPTY_DUE_INDEX)
+
+    def seller_debts(self, seller_name: str) -> List[Dict[str, Any]]:
+        """Sotuvchining barcha qarzdorliklari"""
+        return self.data.get(seller_name, [])
+
+    def due_bucket(self, bucket: str) -> List[Dict[str, Any]]:
+        """Barcha sotuvchilarning ma'lum muddat guruhidagi qarzdorliklari (muddati bo'yicha saralangan)"""
+        return self.due_index.bucket(bucket, today_ordinal())
+
+    def seller_bucket(self, seller_name: str, bucket: str) -> List[Dict[str, Any]]:
+        """Sotuvchining ma'lum muddat guruhidagi qarzdorliklari (muddati bo'yicha saralangan)"""
+        return self._due_index(seller_name).bucket(bucket, today_ordinal())
+
+    def due_within(self, days: int, seller_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Muddati bugundan boshlab `days` kun ichida bo'lgan qarzdorliklar (bugungilar ham kiradi)"""
+        today = today_ordinal()
+        return self._due_index(seller_name).between(today, today + days)
+
+    def overdue_count(self, seller_name: Optional[str] = None) -> int:
+        """Muddati o'tgan qarzdorliklar soni"""
+        return self._due_index(seller_name).count_between(end=today_ordinal() - 1)
+
+    def customer_summary(self, customer_name: str, customer_phone: str) -> Optional[Dict[str, Any]]:
+        """Mijozning qarzdorliklari va yig'indilari (ism + telefon bo'yicha)"""
+        summary = self.by_customer.get((customer_name, customer_phone))
+        if summary is None:
+            return None
+        # Muddati o'tganlar soni bugungi sanaga nisbatan - saralangan ro'yxatda ikkilik qidiruv
+        return {**summary, 'overdue_count': bisect.bisect_left(summary['due_days'], today_ordinal())}
+
+    def customer_debts(self, customer_name: str, customer_phone: str) -> List[Dict[str, Any]]:
+        """Mijozning barcha qarzdorliklari (ism + telefon bo'yicha)"""
+        summary = self.customer_summary(customer_name, customer_phone)
+        return summary['debts'] if summary else []
+
+    def status_debts(self, status: str) -> List[Dict[str, Any]]:
+        """Berilgan holatdagi ("Qarz Statusi", masalan "Просрочен") qarzdorliklar"""
+        return self.by_status.get(status, [])
+
+class SqliteDebtSnapshot:
+    """
+    DebtSnapshot bilan bir xil interfeys, lekin har bir so'rov SQLite indekslari orqali bajariladi
+    (STORAGE_BACKEND=sqlite). Muddat guruhlari so'rov vaqtidagi sanaga nisbatan hisoblanadi.
+    """
+
+    def __init__(self, version: int = 0, aggregates: Optional[Dict[str, Any]] = None):
+        self.version = version
+        self.loaded_at = time.time()
+        self._aggregates = aggregates
+
+    def __bool__(self) -> bool:
+        return database.has_debts()
+
+    aggregates = DebtSnapshot.aggregates
+
+    @property
+    def sellers(self) -> List[str]:
+        return database.get_seller_names()
+
+    @property
+    def all_debts(self) -> List[Dict[str, Any]]:
+        return database.get_all_debts()
+
+    @property
+    def data(self) -> Dict[str, List[Dict[str, Any]]]:
+        data: Dict[str, List[Dict[str, Any]]] = {}
+        for debt in database.get_all_debts():
+            data.setdefault(debt.get('Sotuvchi Ismi', ''), []).append(debt)
+        return data
+
+    def seller_debts(self, seller_name: str) -> List[Dict[str, Any]]:
+        return database.get_seller_debts(seller_name)
+
+    def due_bucket(self, bucket: str) -> List[Dict[str, Any]]:
+        return database.get_due_bucket(bucket)
+
+    def seller_bucket(self, seller_name: str, bucket: str) -> List[Dict[str, Any]]:
+        return database.get_due_bucket(bucket, seller_name)
+
+    def due_within(self, days: int, seller_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        return database.get_due_within(days, seller_name)
+
+    def overdue_count(self, seller_name: Optional[str] = None) -> int:
+        return database.count_due_bucket(BUCKET_OVERDUE, seller_name)
+
+    def customer_summary(self, customer_name: str, customer_phone: str) -> Optional[Dict[str, Any]]:
+        return database.get_customer_summary(customer_name, customer_phone)
+
+    def customer_debts(self, customer_name: str, customer_phone: str) -> List[Dict[str, Any]]:
+        summary = self.customer_summary(customer_name, customer_phone)
+        return summary['debts'] if summary else []
+
+    def status_debts(self, status: str) -> List[Dict[str, Any]]:
+        return database.get_debts_by_status(status)
+
+# Har bir fayl uchun joriy nusxa. Almashtirish bitta o'zlashtirish bilan bajariladi,
+# shuning uchun o'quvchilar har doim to'liq nusxani ko'radi.
+_snapshots: Dict[str, Any] = {}
+_synced_at: Dict[str, Optional[float]] = {}  # Joriy nusxa BILLZ dan olingan vaqt (unix)
+_lock = threading.Lock()
+_version = 0
+# Yangi nusxa uchun qo'shimcha indekslarni (masalan, qidiruv) almashtirishdan oldin,
+# o'sha oqimda qurib qo'yadigan funksiyalar: hook(snapshot, data_file)
+_snapshot_hooks: List[Callable[[Any, str], None]] = []
+
+def add_snapshot_hook(hook: Callable[[Any, str], None]):
+    """Har bir yangi nusxa uchun chaqiriladigan funksiyani qo'shish"""
+    _snapshot_hooks.append(hook)
+
+def replace_data(data: dict, data_file: str = DATA_FILE, aggregates: Optional[Dict[str, Any]] = None,
+                 synced_at: Optional[float] = None):
+    """Yangi ma'lumotlardan indekslarni qurib, joriy nusxani almashtirish"""
+    global _version
+    with _lock:
+        _version += 1
+        if STORAGE_BACKEND == "sqlite":
+            snapshot = SqliteDebtSnapshot(_version, aggregates)
+        else:
+            snapshot = DebtSnapshot(data, _version, aggregates)
+        for hook in _snapshot_hooks:
+            try:
+                hook(snapshot, data_file)
+            except Exception as e:
+                logger.error(f"Nusxa indeksini qurishda xatolik: {e}")
+        _snapshots[data_file] = snapshot
+        _synced_at[data_file] = synced_at
+    logger.info(f"Ma'lumotlar ombori yangilandi (versiya {snapshot.version})")
+    return snapshot
+
+def publish(data: dict, data_file: str = DATA_FILE, aggregates: Optional[Dict[str, Any]] = None):
+    """Sinxronlash natijasini saqlash (fayl yoki SQLite) va joriy nusxani almashtirish"""
+    if STORAGE_BACKEND == "sqlite":
+        database.replace_debts(data)
+    else:
+        save_data(data, data_file)
+    return replace_data(data, data_file, aggregates, time.time())
+
+def persisted_sync_time(data_file: str = DATA_FILE) -> Optional[float]:
+    """Saqlangan ma'lumotlar yozilgan vaqt (hali sinxronlanmagan bo'lsa None)"""
+    if STORAGE_BACKEND == "sqlite":
+        return database.get_last_sync_time()
+    try:
+        return os.path.getmtime(find_data_path(data_file))
+    except OSError:
+        return None
+
+def reload(data_file: str = DATA_FILE):
+    """Faylni qayta o'qib, omborni yangilash"""
+    synced_at = persisted_sync_time(data_file)
+    if STORAGE_BACKEND == "sqlite":
+        return replace_data({}, data_file, synced_at=synced_at)
+    return replace_data(load_data(data_file), data_file, synced_at=synced_at)
+
+def get_snapshot(data_file: str = DATA_FILE):
+    """Joriy nusxani olish (birinchi murojaatda fayldan yuklanadi)"""
+    snapshot = _snapshots.get(data_file)
+    if snapshot is None:
+        snapshot = reload(data_file)
+    return snapshot
+
+def get_sync_time(data_file: str = DATA_FILE) -> Optional[float]:
+    """Joriy nusxadagi ma'lumotlar BILLZ dan olingan vaqt (unix) yoki None"""
+    get_snapshot(data_file)
+    return _synced_at.get(data_file)
+
+def get_data_age(data_file: str = DATA_FILE) -> Optional[float]:
+    """Joriy ma'lumotlar yoshi, sekund (hali sinxronlanmagan bo'lsa None)"""
+    synced_at = get_sync_time(data_file)
+    return max(0.0, time.time() - synced_at) if synced_at is not None else None
+
+def format_age(seconds: Optional[float]) -> str:
+    """Ma'lumotlar yoshi o'qiladigan ko'rinishda (masalan, "5 daqiqa", "3 soat", "2 kun")"""
+    if seconds is None:
+        return "noma'lum"
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "1 daqiqadan kam"
+    if minutes < 60:
+        return f"{minutes} daqiqa"
+    if minutes < 24 * 60:
+        return f"{minutes // 60} soat"
+    return f"{minutes // (24 * 60)} kun"
@@ -0,0 +1,118 @@
+# sync.py - BILLZ sinxronlashlarini muvofiqlashtirish: bir vaqtda faqat bitta yangilash bajariladi
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from api_handler import get_sync_progress
+
+logger = logging.getLogger(__name__)
+
+# job(full, remind) -> muvaffaqiyatli bo'lsa True
+SyncJob = Callable[[bool, bool], Awaitable[bool]]
+
+class SyncCoordinator:
+    """
+    Single-flight: yangilash bajarilayotganda kelgan so'rovlar yangisini boshlamaydi,
+    bajarilayotganiga qo'shilib, uning natijasini oladi. Shu bilan bir vaqtdagi ikkita to'liq
+    yuklash data.json ga navbatsiz yozishi va eslatmalar ikki marta yuborilishining oldi olinadi.
+    Bajarilayotgan yangilash so'rovni qoplamasa (to'liq yuklash yoki eslatmalar kerak, u esa
+    bermaydi), talablar yig'ilib, u tugagach bitta navbatdagi yangilash bajariladi.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.kind: Optional[str] = None
+        self.full = False
+        self.remind = False
+        self.started = 0.0
+        self.runs = 0
+        self.joined = 0
+        self.queued = 0
+        # Navbatdagi yangilash: joriysi tugashini kutayotgan vazifa va yig'ilgan talablar
+        self.pending: Optional[asyncio.Task] = None
+        self.pending_kind: Optional[str] = None
+        self.pending_full = False
+        self.pending_remind = False
+
+    def is_running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def covers(self, full: bool, remind: bool) -> bool:
+        """Bajarilayotgan yangilash shu talablarni qoplaydimi"""
+        return (self.full or not full) and (self.remind or not remind)
+
+    async def _run(self, job: SyncJob, full: bool, remind: bool) -> bool:
+        try:
+            return await job(full, remind)
+        except Exception as e:
+            logger.error(f"Sinxronlashda kutilmagan xatolik: {e}")
+            return False
+
+    def _start(self, kind: str, job: SyncJob, full: bool, remind: bool):
+        self.runs += 1
+        self.kind, self.full, self.remind = kind, full, remind
+        self.started = time.monotonic()
+        self.task = asyncio.create_task(self._run(job, full, remind))
+
+    async def _run_pending(self, job: SyncJob) -> bool:
+        """Joriy yangilash tugagach, yig'ilgan talablar bilan navbatdagisini bajarish"""
+        # wait() joriy yangilash natijasi yoki xatosini ko'tarmaydi - faqat tugashini kutadi
+        await asyncio.wait({self.task})
+        kind, full, remind = self.pending_kind, self.pending_full, self.pending_remind
+        self.pending, self.pending_kind, self.pending_full, self.pending_remind = None, None, False, False
+        logger.info(f"Navbatdagi '{kind}' yangilash boshlandi (to'liq: {full}, eslatmalar: {remind})")
+        self._start(kind, job, full, remind)
+        return await self.task
+
+    async def run(self, kind: str, job: SyncJob, full: bool = False, remind: bool = False) -> bool:
+        """
+        job(full, remind) ni bajarish yoki bajarilayotgan yangilashni kutish.
+
+        Args:
+            kind: Yangilash turi (loglar va holat uchun): 'startup', 'scheduled', 'manual'
+            job: Korutina qaytaruvchi funksiya - faqat yangi yangilash boshlanganda chaqiriladi
+            full: To'liq yuklash kerak (qisman yangilash yetarli emas)
+            remind: Yangilangandan keyin kunlik eslatmalar yuborilishi kerak
+
+        Returns:
+            Yangilash natijasi (muvaffaqiyatli bo'lsa True)
+        """
+        if self.is_running() and self.covers(full, remind):
+            self.joined += 1
+            logger.info(f"'{kind}' yangilash so'rovi bajarilayotgan '{self.kind}' yangilashga qo'shildi")
+            task = self.task
+        elif not self.is_running() and self.pending is None:
+            self._start(kind, job, full, remind)
+            task = self.task
+        else:
+            # Joriy yangilash yetarli emas yoki tugagan, lekin navbatdagisi hali boshlanmagan -
+            # talablar navbatdagi yangilashga qo'shiladi (yangisini boshlash ikki yangilashni parallel qilardi)
+            self.queued += 1
+            self.pending_full = self.pending_full or full
+            self.pending_remind = self.pending_remind or remind
+            if self.pending is None:
+                self.pending_kind = kind
+                self.pending = asyncio.create_task(self._run_pending(job))
+            logger.info(f"'{kind}' yangilash so'rovi navbatdagi yangilashga qo'shildi")
+            task = self.pending
+        # Kutayotgan handler bekor qilinsa ham yangilash to'xtamaydi
+        return await asyncio.shield(task)
+
+    def cancel(self):
+        """Bajarilayotgan va navbatdagi yangilashlarni to'xtatish (bot to'xtaganda)"""
+        for task in (self.pending, self.task):
+            if task is not None and not task.done():
+                task.cancel()
+
+    def progress(self) -> Optional[Dict[str, Any]]:
+        """Bajarilayotgan yangilash holati (bo'lmasa None)"""
+        if not self.is_running():
+            return None
+        return {
+            **get_sync_progress(),
+            'kind': self.kind,
+            'seconds': round(time.monotonic() - self.started, 1),
+        }
+
+sync_coordinator = SyncCoordinator()